@@ -0,0 +1,159 @@
+# auth_client.py
+import http.client
+import json
+import socket
+import threading
+from contextlib import contextmanager
+from urllib.parse import unquote, urlparse
+
+import requests
+
+class HTTPTransport:
+    """Talks to the auth service over TCP, reusing connections"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self._local = threading.local()
+
+    def _session(self):
+        # requests.Session is not thread-safe; Streamlit runs each browser session on its own thread
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def request(self, method, path, json_body=None, headers=None):
+        return self._session().request(method, f"{self.base_url}{path}", json=json_body, headers=headers)
+
+    @contextmanager
+    def stream_lines(self, path, headers=None, timeout=60):
+        with requests.get(
+            f"{self.base_url}{path}", headers=headers, stream=True, timeout=(5, timeout)
+        ) as response:
+            response.raise_for_status()
+            yield response.iter_lines(decode_unicode=True)
+
+class AuthResponse:
+    """The part of requests.Response the apps use"""
+
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.content = body
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.content)
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+class UnixSocketTransport:
+    """Talks to a co-located auth service over its Unix domain socket (AUTH_SERVICE_UDS).
+
+    Skips TCP and loopback networking; each thread keeps one persistent
+    connection. The service itself still owns all token, session and
+    revocation state, so apps and service stay consistent.
+    """
+
+    def __init__(self, socket_path, timeout=10):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        if not hasattr(self._local, "conn"):
+            self._local.conn = _UnixHTTPConnection(self.socket_path, self.timeout)
+        return self._local.conn
+
+    def request(self, method, path, json_body=None, headers=None):
+        body = json.dumps(json_body).encode() if json_body is not None else None
+        headers = dict(headers or {})
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+        conn = self._connection()
+        try:
+            try:
+                return self._exchange(conn, method, path, body, headers)
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # The server closed an idle keep-alive connection; retry once on a fresh one
+                conn.close()
+                return self._exchange(conn, method, path, body, headers)
+        except BaseException:
+            # After a timeout or any other failure mid-exchange the connection is
+            # stuck (CannotSendRequest); close it so the next call reconnects
+            conn.close()
+            raise
+
+    @staticmethod
+    def _exchange(conn, method, path, body, headers):
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        return AuthResponse(response.status, response.read())
+
+    @contextmanager
+    def stream_lines(self, path, headers=None, timeout=60):
+        conn = _UnixHTTPConnection(self.socket_path, timeout)
+        try:
+            conn.request("GET", path, headers=headers or {})
+            response = conn.getresponse()
+            if response.status != 200:
+                raise http.client.HTTPException(f"{path} returned {response.status}")
+            yield (line.decode().rstrip("\r\n") for line in response)
+        finally:
+            conn.close()
+
+def transport_from_url(url):
+    """unix:///path/to/auth.sock selects the Unix socket transport, anything else HTTP"""
+    parsed = urlparse(url)
+    if parsed.scheme in ("unix", "http+unix"):
+        return UnixSocketTransport(unquote(parsed.path or parsed.netloc))
+    return HTTPTransport(url)
+
+class AuthClient:
+    """Auth service calls, independent of how the service is reached"""
+
+    def __init__(self, transport, events_key=None):
+        self.transport = transport
+        self.events_key = events_key
+
+    def register(self, email, password):
+        return self.transport.request("POST", "/register", {"email": email, "password": password})
+
+    def login(self, email, password, device_token=None):
+        return self.transport.request(
+            "POST", "/login", {"email": email, "password": password, "device_token": device_token}
+        )
+
+    def verify_otp(self, email, otp_code, remember_device=False):
+        return self.transport.request(
+            "POST", "/verify-otp", {"email": email, "otp_code": otp_code, "remember_device": remember_device}
+        )
+
+    def verify_token(self, token):
+        return self.transport.request("GET", "/verify-token", headers={"Authorization": f"Bearer {token}"})
+
+    def logout(self, token):
+        return self.transport.request("POST", "/logout", headers={"Authorization": f"Bearer {token}"})
+
+    def create_session(self, token):
+        return self.transport.request("POST", "/create-session", headers={"Authorization": f"Bearer {token}"})
+
+    def get_session(self, session_id):
+        return self.transport.request("GET", f"/get-session/{session_id}")
+
+    def event_lines(self, last_event_id=None):
+        """Context manager over the raw lines of the /events stream"""
+        headers = {"X-Events-Key": self.events_key} if self.events_key else {}
+        if last_event_id:
+            headers["Last-Event-ID"] = last_event_id
+        return self.transport.stream_lines("/events", headers=headers)
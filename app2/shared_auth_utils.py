@@ -1,16 +1,33 @@
 # shared_auth_utils.py
-import requests
 import streamlit as st
 import os
 import json
 import tempfile
+import threading
+import time
+import base64
+import hashlib
+import hmac
 from pathlib import Path
 from dotenv import load_dotenv
 from urllib.parse import parse_qs
 
+from auth_client import AuthClient, transport_from_url
+
 load_dotenv()
 
 AUTH_SERVICE_URL = os.getenv("AUTH_SERVICE_URL")
+# Same value as the auth service's EVENTS_SECRET; without it tokens are never cached
+EVENTS_SECRET = os.getenv("EVENTS_SECRET")
+# http://host:port, or unix:///path/to/auth.sock when running next to the auth service
+auth_client = AuthClient(transport_from_url(AUTH_SERVICE_URL), events_key=EVENTS_SECRET)
+# Upper bound on trusting a cached verification even without any events
+VERIFY_CACHE_SECONDS = int(os.getenv("AUTH_VERIFY_CACHE_SECONDS", "300"))
+
+# token -> (email, trusted_until); only used while the event stream is connected
+_verified_tokens = {}
+_cache_lock = threading.Lock()
+_listener_state = {"thread": None, "connected": False, "generation": 0}
 
 def get_temp_dir():
     """Get a shared temporary directory for session storage"""
@@ -48,8 +65,7 @@ def load_shared_session():
             session_data = json.load(f)
         
         # Verify the token is still valid
-        response = verify_token(session_data["token"])
-        if response.status_code == 200:
+        if is_token_valid(session_data["token"]):
             return session_data
         else:
             # Token is invalid, remove the session file
@@ -68,46 +84,166 @@ def clear_shared_session():
     except Exception as e:
         print(f"Error clearing shared session: {e}")
 
+def _fingerprint(value):
+    """Same fingerprint the auth service puts in its events"""
+    return hmac.new(EVENTS_SECRET.encode(), value.encode(), hashlib.sha256).hexdigest()[:32]
+
+def _token_claims(token):
+    """Read (not verify) a token's claims; only used to bound cache lifetime"""
+    try:
+        payload = token.split(".")[1]
+        return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except Exception:
+        return {}
+
+def _invalidate(predicate):
+    """Drop cached tokens (and the shared session) matching predicate(token, email)"""
+    with _cache_lock:
+        _listener_state["generation"] += 1
+        for token, (email, _) in list(_verified_tokens.items()):
+            if predicate(token, email):
+                del _verified_tokens[token]
+    
+    try:
+        session_file = get_temp_dir() / "current_session.json"
+        if session_file.exists():
+            with open(session_file, 'r') as f:
+                session_data = json.load(f)
+            if predicate(session_data["token"], session_data["email"]):
+                session_file.unlink()
+    except Exception as e:
+        print(f"Error invalidating shared session: {e}")
+
+def _handle_auth_event(event_type, data):
+    if event_type == "reset":
+        with _cache_lock:
+            _listener_state["generation"] += 1
+            _verified_tokens.clear()
+    elif event_type == "logout":
+        _invalidate(lambda token, email: _fingerprint(token) == data.get("token"))
+    elif event_type == "revoked":
+        _invalidate(lambda token, email: _fingerprint(email.lower()) == data.get("email"))
+
+def _listen_for_auth_events():
+    """Follow the auth service's /events stream, reconnecting with Last-Event-ID"""
+    last_event_id = None
+    while True:
+        try:
+            with auth_client.event_lines(last_event_id) as lines:
+                _listener_state["connected"] = True
+                event_type, data = None, {}
+                for line in lines:
+                    if line.startswith("id:"):
+                        last_event_id = line[3:].strip()
+                    elif line.startswith("event:"):
+                        event_type = line[6:].strip()
+                    elif line.startswith("data:"):
+                        data = json.loads(line[5:])
+                    elif not line and event_type:
+                        _handle_auth_event(event_type, data)
+                        event_type, data = None, {}
+        except Exception as e:
+            print(f"Auth event stream error: {e}")
+        finally:
+            # Nothing cached can be trusted while we might be missing events
+            with _cache_lock:
+                _listener_state["connected"] = False
+                _listener_state["generation"] += 1
+                _verified_tokens.clear()
+        time.sleep(2)
+
+def start_auth_event_listener():
+    """Start the event listener thread once per process"""
+    if not EVENTS_SECRET:
+        return
+    with _cache_lock:
+        if _listener_state["thread"] is None:
+            thread = threading.Thread(target=_listen_for_auth_events, daemon=True)
+            _listener_state["thread"] = thread
+            thread.start()
+
+def is_token_valid(token):
+    """Check a token, trusting a cached result until an event says otherwise"""
+    start_auth_event_listener()
+    now = time.time()
+    with _cache_lock:
+        entry = _verified_tokens.get(token) if _listener_state["connected"] else None
+        generation = _listener_state["generation"]
+    if entry and entry[1] > now:
+        return True
+    
+    response = verify_token(token)
+    if response.status_code != 200:
+        return False
+    
+    trusted_until = min(_token_claims(token).get("exp", 0), now + VERIFY_CACHE_SECONDS)
+    with _cache_lock:
+        # Skip caching if an invalidation raced with the HTTP check
+        if _listener_state["connected"] and generation == _listener_state["generation"]:
+            if len(_verified_tokens) >= 1000:
+                _verified_tokens.clear()
+            _verified_tokens[token] = (response.json()["email"], trusted_until)
+    return True
+
+def save_device_token(email, device_token):
+    """Remember the trusted-device token issued for email on this machine"""
+    try:
+        temp_dir = get_temp_dir()
+        temp_dir.mkdir(exist_ok=True)
+        
+        devices_file = temp_dir / "trusted_devices.json"
+        devices = {}
+        if devices_file.exists():
+            with open(devices_file, 'r') as f:
+                devices = json.load(f)
+        devices[email] = device_token
+        
+        with open(devices_file, 'w') as f:
+            json.dump(devices, f)
+    except Exception as e:
+        print(f"Error saving device token: {e}")
+
+def load_device_token(email):
+    """Get the trusted-device token for email, if this machine has one"""
+    try:
+        devices_file = get_temp_dir() / "trusted_devices.json"
+        if not devices_file.exists():
+            return None
+        
+        with open(devices_file, 'r') as f:
+            return json.load(f).get(email)
+    except Exception as e:
+        print(f"Error loading device token: {e}")
+        return None
+
 def register_user(email, password):
-    response = requests.post(
-        f"{AUTH_SERVICE_URL}/register",
-        json={"email": email, "password": password}
-    )
-    return response
-
-def login_user(email, password):
-    response = requests.post(
-        f"{AUTH_SERVICE_URL}/login",
-        json={"email": email, "password": password}
-    )
-    return response
-
-def verify_otp(email, otp_code):
-    response = requests.post(
-        f"{AUTH_SERVICE_URL}/verify-otp",
-        json={"email": email, "otp_code": otp_code}
-    )
-    return response
+    return auth_client.register(email, password)
+
+def login_user(email, password, device_token=None):
+    return auth_client.login(email, password, device_token)
+
+def verify_otp(email, otp_code, remember_device=False):
+    return auth_client.verify_otp(email, otp_code, remember_device)
 
 def verify_token(token):
-    response = requests.get(
-        f"{AUTH_SERVICE_URL}/verify-token",
-        headers={"Authorization": f"Bearer {token}"}
-    )
-    return response
+    return auth_client.verify_token(token)
+
+def logout_user(token):
+    """Revoke the token on the auth service; other apps hear about it via /events"""
+    _invalidate(lambda cached_token, email: cached_token == token)
+    try:
+        return auth_client.logout(token)
+    except Exception as e:
+        print(f"Error logging out: {e}")
+        return None
 
 def create_shared_session(token):
     """Create a session on the auth service"""
-    response = requests.post(
-        f"{AUTH_SERVICE_URL}/create-session",
-        headers={"Authorization": f"Bearer {token}"}
-    )
-    return response
+    return auth_client.create_session(token)
 
 def get_session_from_auth_service(session_id):
     """Get session data from auth service"""
-    response = requests.get(f"{AUTH_SERVICE_URL}/get-session/{session_id}")
-    return response
+    return auth_client.get_session(session_id)
 
 def is_logged_in():
     """Check if user is logged in (either in session state or shared session)"""
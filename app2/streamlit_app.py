@@ -3,8 +3,9 @@ import requests
 import pandas as pd
 import random
 from shared_auth_utils import (
-    register_user, login_user, verify_otp, verify_token, is_logged_in,
-    save_shared_session, clear_shared_session, get_cross_app_url
+    register_user, login_user, verify_otp, is_token_valid, logout_user, is_logged_in,
+    save_shared_session, clear_shared_session, get_cross_app_url,
+    save_device_token, load_device_token
 )
 
 st.set_page_config(page_title="App 2 - Analytics", page_icon="📈")
@@ -29,6 +30,7 @@ def main_app():
     st.markdown(f'<a href="{app1_url}" target="_blank">🔗 Open App 1 (Shared Session)</a>', unsafe_allow_html=True)
     
     if st.button("Logout"):
+        logout_user(st.session_state.access_token)
         clear_shared_session()
         st.session_state.access_token = None
         st.session_state.user_email = None
@@ -46,8 +48,16 @@ def auth_page():
         
         if st.button("Login"):
             if email and password:
-                response = login_user(email, password)
+                response = login_user(email, password, load_device_token(email))
                 if response.status_code == 200:
+                    login_data = response.json()
+                    if "access_token" in login_data:
+                        # Trusted device: no OTP needed
+                        st.session_state.access_token = login_data["access_token"]
+                        st.session_state.user_email = email
+                        save_shared_session(email, login_data["access_token"])
+                        st.success("Login successful!")
+                        st.rerun()
                     st.session_state.pending_email = email
                     st.session_state.show_otp = True
                     st.success("OTP sent to your email!")
@@ -77,12 +87,15 @@ def otp_page():
     st.write(f"Please enter the OTP sent to {st.session_state.pending_email}")
     
     otp_code = st.text_input("OTP Code", max_chars=6)
+    remember_device = st.checkbox("Trust this device (skip OTP next time)")
     
     if st.button("Verify OTP"):
         if otp_code:
-            response = verify_otp(st.session_state.pending_email, otp_code)
+            response = verify_otp(st.session_state.pending_email, otp_code, remember_device)
             if response.status_code == 200:
                 token_data = response.json()
+                if token_data.get("device_token"):
+                    save_device_token(st.session_state.pending_email, token_data["device_token"])
                 st.session_state.access_token = token_data["access_token"]
                 st.session_state.user_email = st.session_state.pending_email
                 st.session_state.show_otp = False
@@ -108,9 +121,8 @@ if "pending_email" not in st.session_state:
 
 # Main app logic
 if is_logged_in():
-    # Verify token is still valid
-    response = verify_token(st.session_state.access_token)
-    if response.status_code == 200:
+    # Verify token is still valid (cached between logout/revocation events)
+    if is_token_valid(st.session_state.access_token):
         main_app()
     else:
         clear_shared_session()
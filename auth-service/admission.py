@@ -0,0 +1,187 @@
+import asyncio
+import bisect
+import itertools
+import os
+from dotenv import load_dotenv
+from fastapi.responses import JSONResponse
+
+load_dotenv()
+
+ADMISSION_CAPACITY = int(os.getenv("ADMISSION_CAPACITY", "64"))
+ADMISSION_READ_TIMEOUT_MS = int(os.getenv("ADMISSION_READ_TIMEOUT_MS", "250"))
+ADMISSION_WRITE_TIMEOUT_MS = int(os.getenv("ADMISSION_WRITE_TIMEOUT_MS", "2000"))
+DEADLINE_HEADER = "x-request-timeout-ms"
+DEADLINE_HEADER_BYTES = DEADLINE_HEADER.encode()
+
+class Overloaded(Exception):
+    pass
+
+class RouteLimit:
+    """Concurrency cap, wait-queue bound and start deadline for one route class.
+
+    Lower priority numbers are admitted first when a shared slot frees up.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, timeout_ms: int, priority: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout_ms = timeout_ms
+        self.priority = priority
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_deadline = 0
+
+    def stats(self):
+        return {
+            "priority": self.priority,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "timeout_ms": self.timeout_ms,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_deadline": self.shed_deadline,
+        }
+
+class AdmissionController:
+    """Shares `capacity` request slots between route classes in priority order"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.in_flight = 0
+        self.routes = {}
+        self._prefixes = {}
+        # Sorted (priority, seq, route, future) entries; seq keeps FIFO order within a priority
+        self._waiters = []
+        self._seq = itertools.count()
+
+    def add_route(self, limit: RouteLimit, *paths: str):
+        self.routes[limit.name] = limit
+        for path in paths:
+            self._prefixes[path] = limit
+
+    def route_for(self, path: str):
+        return self._prefixes.get("/" + path.lstrip("/").split("/", 1)[0])
+
+    def _can_start(self, route: RouteLimit) -> bool:
+        return self.in_flight < self.capacity and route.in_flight < route.max_concurrency
+
+    def _start(self, route: RouteLimit):
+        self.in_flight += 1
+        route.in_flight += 1
+        route.admitted += 1
+
+    def _remove(self, entry) -> bool:
+        index = bisect.bisect_left(self._waiters, entry[:2])
+        if index < len(self._waiters) and self._waiters[index] is entry:
+            del self._waiters[index]
+            entry[2].queued -= 1
+            return True
+        return False
+
+    def _expire(self, entry):
+        if self._remove(entry):
+            entry[2].shed_deadline += 1
+            entry[3].set_exception(Overloaded(f"{entry[2].name}: deadline exceeded while queued"))
+
+    def _dispatch(self):
+        index = 0
+        while index < len(self._waiters) and self.in_flight < self.capacity:
+            entry = self._waiters[index]
+            route, future = entry[2], entry[3]
+            if route.in_flight < route.max_concurrency:
+                del self._waiters[index]
+                route.queued -= 1
+                self._start(route)
+                future.set_result(None)
+            else:
+                index += 1
+
+    async def acquire(self, route: RouteLimit, timeout_ms: int):
+        # After every release the queue holds only waiters that cannot start,
+        # so a request that can start right away is not jumping anyone.
+        if self._can_start(route):
+            self._start(route)
+            return
+        if route.queued >= route.max_queue or timeout_ms <= 0:
+            route.shed_queue_full += 1
+            raise Overloaded(f"{route.name}: queue full")
+
+        loop = asyncio.get_running_loop()
+        entry = (route.priority, next(self._seq), route, loop.create_future())
+        bisect.insort(self._waiters, entry)
+        route.queued += 1
+        timer = loop.call_later(timeout_ms / 1000, self._expire, entry)
+        try:
+            await entry[3]
+        except asyncio.CancelledError:
+            future = entry[3]
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # Admitted just as the client went away; hand the slot back
+                self.release(route)
+            else:
+                self._remove(entry)
+            raise
+        finally:
+            timer.cancel()
+
+    def release(self, route: RouteLimit):
+        self.in_flight -= 1
+        route.in_flight -= 1
+        self._dispatch()
+
+    def stats(self):
+        return {
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "routes": {name: route.stats() for name, route in self.routes.items()},
+        }
+
+controller = AdmissionController(ADMISSION_CAPACITY)
+# Cheap token/session reads go first; bcrypt + SMTP paths get few slots and a longer wait
+controller.add_route(RouteLimit("read", 48, 256, ADMISSION_READ_TIMEOUT_MS, 0), "/verify-token", "/get-session")
+controller.add_route(RouteLimit("session-write", 16, 64, ADMISSION_READ_TIMEOUT_MS, 1), "/create-session")
+controller.add_route(RouteLimit("auth-write", 8, 32, ADMISSION_WRITE_TIMEOUT_MS, 2), "/login", "/register", "/verify-otp")
+
+def _requested_timeout_ms(scope):
+    for name, value in scope["headers"]:
+        if name == DEADLINE_HEADER_BYTES:
+            return int(value) if value.isdigit() else None
+    return None
+
+class AdmissionMiddleware:
+    """Plain ASGI middleware: admits or sheds before any other middleware or handler runs"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        route = controller.route_for(scope["path"]) if scope["type"] == "http" else None
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        timeout_ms = route.timeout_ms
+        requested = _requested_timeout_ms(scope)
+        if requested is not None:
+            timeout_ms = min(timeout_ms, requested)
+
+        try:
+            await controller.acquire(route, timeout_ms)
+        except Overloaded:
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Service overloaded, please retry"},
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(route)
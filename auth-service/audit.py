@@ -0,0 +1,206 @@
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import create_engine, event, insert, Column, Integer, String, Float, DateTime, Index
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+from dotenv import load_dotenv
+
+load_dotenv()
+
+AUDIT_DATABASE_URL = os.getenv("AUDIT_DATABASE_URL", "sqlite:///./audit.db")
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_SECONDS = float(os.getenv("AUDIT_FLUSH_SECONDS", "0.5"))
+
+# A separate database file so audit group commits never take the auth.db lock
+audit_engine = create_engine(AUDIT_DATABASE_URL, connect_args={"check_same_thread": False})
+
+@event.listens_for(audit_engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+AuditSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=audit_engine)
+AuditBase = declarative_base()
+
+class AuditEvent(AuditBase):
+    __tablename__ = "audit_events"
+
+    id = Column(Integer, primary_key=True)
+    ts = Column(DateTime, index=True)
+    event = Column(String)
+    email = Column(String)
+    client = Column(String)
+    outcome = Column(String)
+    status_code = Column(Integer)
+    latency_ms = Column(Float)
+
+    __table_args__ = (Index("ix_audit_events_email_ts", "email", "ts"),)
+
+AuditBase.metadata.create_all(bind=audit_engine)
+
+# Paths that produce an audit event, by first path segment
+AUDITED_PATHS = {
+    "/register": "register",
+    "/login": "login",
+    "/verify-otp": "verify_otp",
+    "/create-session": "create_session",
+    "/get-session": "get_session",
+    "/logout": "logout",
+}
+
+_queue = queue.Queue(maxsize=AUDIT_QUEUE_SIZE)
+stats = {"queued": 0, "dropped": 0, "written": 0, "batches": 0, "write_seconds": 0.0, "last_error": None}
+
+def record(event_name: str, email, client, status_code: int, latency_ms: float):
+    """Queue one event; never blocks the request (drops and counts when full)"""
+    try:
+        _queue.put_nowait({
+            "ts": datetime.utcnow(),
+            "event": event_name,
+            "email": email,
+            "client": client,
+            "outcome": "success" if status_code < 400 else "failure",
+            "status_code": status_code,
+            "latency_ms": latency_ms,
+        })
+        stats["queued"] += 1
+    except queue.Full:
+        stats["dropped"] += 1
+
+def _write_batch(rows):
+    started = time.perf_counter()
+    db = AuditSessionLocal()
+    try:
+        db.execute(insert(AuditEvent), rows)
+        db.commit()
+    finally:
+        db.close()
+    stats["written"] += len(rows)
+    stats["batches"] += 1
+    stats["write_seconds"] += time.perf_counter() - started
+
+def _writer_loop(stop_event: threading.Event):
+    """Group-commit queued events: block for the first, then take what else arrives in the window"""
+    while not (stop_event.is_set() and _queue.empty()):
+        try:
+            rows = [_queue.get(timeout=AUDIT_FLUSH_SECONDS)]
+        except queue.Empty:
+            continue
+        deadline = time.monotonic() + AUDIT_FLUSH_SECONDS
+        while len(rows) < AUDIT_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            try:
+                rows.append(_queue.get(timeout=remaining) if remaining > 0 else _queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            _write_batch(rows)
+            stats["last_error"] = None
+        except Exception as e:
+            stats["last_error"] = str(e)
+            print(f"Audit write error ({len(rows)} events lost): {e}")
+
+_writer = {"thread": None, "stop": threading.Event()}
+
+def start_writer():
+    if _writer["thread"] is None:
+        _writer["thread"] = threading.Thread(target=_writer_loop, args=(_writer["stop"],), daemon=True)
+        _writer["thread"].start()
+
+def stop_writer():
+    """Flush what is queued and stop the writer thread"""
+    if _writer["thread"] is not None:
+        _writer["stop"].set()
+        _writer["thread"].join()
+        _writer["thread"] = None
+
+class AuditMiddleware:
+    """Plain ASGI middleware: times audited requests and queues an event.
+
+    Handlers set request.state.audit_email; other paths pass straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        event_name = None
+        if scope["type"] == "http":
+            event_name = AUDITED_PATHS.get("/" + scope["path"].lstrip("/").split("/", 1)[0])
+        if event_name is None:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        # request.state reads and writes this same dict
+        state = scope.setdefault("state", {})
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            client = scope.get("client")
+            record(
+                event_name,
+                state.get("audit_email"),
+                client[0] if client else None,
+                status_code,
+                round((time.perf_counter() - started) * 1000, 3),
+            )
+
+def _to_dict(row):
+    return {
+        "id": row.id,
+        "ts": row.ts.isoformat(),
+        "event": row.event,
+        "email": row.email,
+        "client": row.client,
+        "outcome": row.outcome,
+        "status_code": row.status_code,
+        "latency_ms": row.latency_ms,
+    }
+
+def query_events(email=None, since=None, until=None, after_id: int = 0, limit: int = 100):
+    """Events in id order, filtered by email and time range; page with after_id"""
+    db = AuditSessionLocal()
+    try:
+        query = db.query(AuditEvent).filter(AuditEvent.id > after_id)
+        if email:
+            query = query.filter(AuditEvent.email == email)
+        if since:
+            query = query.filter(AuditEvent.ts >= since)
+        if until:
+            query = query.filter(AuditEvent.ts < until)
+        rows = query.order_by(AuditEvent.id).limit(limit).all()
+    finally:
+        db.close()
+    return {
+        "events": [_to_dict(row) for row in rows],
+        "next_after_id": rows[-1].id if len(rows) == limit else None,
+    }
+
+def export_ndjson(email=None, since=None, until=None, page_size: int = 1000):
+    after_id = 0
+    while True:
+        page = query_events(email, since, until, after_id, page_size)
+        if page["events"]:
+            yield "".join(json.dumps(event) + "\n" for event in page["events"])
+        if page["next_after_id"] is None:
+            return
+        after_id = page["next_after_id"]
+
+def get_stats():
+    return dict(stats, queue_depth=_queue.qsize())
@@ -1,13 +1,14 @@
+import secrets
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
 from passlib.context import CryptContext
 import os
 from dotenv import load_dotenv
 
+import keys
+import revocation
+
 load_dotenv()
 
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -24,16 +25,27 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    epoch = datetime(1970, 1, 1)
+    to_encode.update({
+        # Unique per token, so logout revokes exactly this token
+        "jti": secrets.token_urlsafe(16),
+        "iat": int((datetime.utcnow() - epoch).total_seconds()),
+        "exp": int((expire - epoch).total_seconds()),
+    })
+    return keys.key_manager.encode(to_encode)
+
+def get_token_claims(token: str):
+    """Claims of a validly signed, unexpired and unrevoked token, else None"""
+    payload = keys.key_manager.decode(token)
+    if payload is None or revocation.is_revoked(token, payload):
+        return None
+    return payload
 
 def verify_token(token: str):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        return email
-    except JWTError:
-        return None
\ No newline at end of file
+    payload = get_token_claims(token)
+    if payload is None:
+        return None
+    email: str = payload.get("sub")
+    if email is None:
+        return None
+    return email
\ No newline at end of file
@@ -0,0 +1,51 @@
+"""Compare JWT sign/verify throughput per algorithm.
+
+    python benchmark_jwt.py [iterations]
+
+Keys are generated in memory; python-jose (raw key string per call) is
+included for reference when it is installed.
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+import keys
+
+def throughput(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return iterations / (time.perf_counter() - started)
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    claims = {"sub": "someone@example.com", "exp": int(time.time()) + 1800}
+    managers = {
+        "HS256": keys.KeyManager([keys.HS256Key("hs", os.urandom(32).hex())], "hs"),
+        "ES256": keys.KeyManager([keys.ES256Key("es", private_key=ec.generate_private_key(ec.SECP256R1()))], "es"),
+        "EdDSA": keys.KeyManager([keys.EdDSAKey("ed", private_key=ed25519.Ed25519PrivateKey.generate())], "ed"),
+    }
+
+    print(f"{'implementation':<22}{'sign/s':>12}{'verify/s':>12}{'token bytes':>14}")
+    for alg, manager in managers.items():
+        token = manager.encode(claims)
+        assert manager.decode(token) == claims
+        sign_rate = throughput(lambda: manager.encode(claims), iterations)
+        verify_rate = throughput(lambda: manager.decode(token), iterations)
+        print(f"{'keys ' + alg:<22}{sign_rate:>12,.0f}{verify_rate:>12,.0f}{len(token):>14}")
+
+    try:
+        from jose import jwt
+    except ImportError:
+        return
+    secret = os.urandom(32).hex()
+    token = jwt.encode(claims, secret, algorithm="HS256")
+    sign_rate = throughput(lambda: jwt.encode(claims, secret, algorithm="HS256"), iterations)
+    verify_rate = throughput(lambda: jwt.decode(token, secret, algorithms=["HS256"]), iterations)
+    print(f"{'python-jose HS256':<22}{sign_rate:>12,.0f}{verify_rate:>12,.0f}{len(token):>14}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Per-request CPU for /verify-token and /get-session, before and after the fast path.
+
+    python benchmark_serialization.py [iterations]
+
+The fast path is main.app itself, called through ASGI with its deployed
+middleware (admission control, audit log, profiling when enabled) and the
+audit writer running. The baseline mounts the old handlers behind the same
+middleware stack, so the difference is what the handlers save per request
+as the service runs, not just in isolation. The network is not included.
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+
+from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+
+import audit
+import main
+import session_store
+from auth import create_access_token, verify_token
+
+def baseline_app():
+    """The handlers as they were (HTTPBearer dependency, dict results, json.load per
+    read) behind the same middleware as main.app"""
+    app = FastAPI()
+    app.user_middleware = list(main.app.user_middleware)
+    security = HTTPBearer()
+
+    @app.get("/verify-token")
+    async def verify_user_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+        email = verify_token(credentials.credentials)
+        if email is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+        return {"email": email}
+
+    @app.get("/get-session/{session_id}")
+    async def get_session(session_id: str):
+        session_file = Path("sessions") / f"{session_id}.json"
+        if not session_file.exists():
+            raise HTTPException(status_code=404, detail="Session not found")
+        with open(session_file, "r") as f:
+            session_data = json.load(f)
+        if datetime.utcnow() > datetime.fromisoformat(session_data["expires_at"]):
+            raise HTTPException(status_code=401, detail="Session expired")
+        return session_data
+
+    return app
+
+async def call(app, path: str, headers):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": headers, "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 8000),
+    }
+    status_code = None
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+
+    await app(scope, receive, send)
+    return status_code
+
+async def cpu_per_request(app, path, headers, iterations):
+    assert await call(app, path, headers) == 200, path
+    started = time.process_time()
+    for _ in range(iterations):
+        await call(app, path, headers)
+    return (time.process_time() - started) / iterations * 1e6
+
+async def run(iterations):
+    token = create_access_token({"sub": "someone@example.com"}, timedelta(minutes=30))
+    session_id = str(uuid.uuid4())
+    session_store.save_session(session_id, {
+        "email": "someone@example.com",
+        "token": token,
+        "created_at": datetime.utcnow().isoformat(),
+        "expires_at": (datetime.utcnow() + timedelta(minutes=30)).isoformat(),
+    })
+    auth_headers = [(b"authorization", f"Bearer {token}".encode())]
+    apps = {"baseline": baseline_app(), "fast path": main.app}
+
+    # Audited requests are queued for the writer thread, whose CPU counts too
+    audit.start_writer()
+    try:
+        print(f"{'endpoint':<16}{'baseline us':>14}{'fast path us':>14}{'saved':>8}")
+        for name, path, headers in [
+            ("/verify-token", "/verify-token", auth_headers),
+            ("/get-session", f"/get-session/{session_id}", []),
+        ]:
+            results = [await cpu_per_request(app, path, headers, iterations) for app in apps.values()]
+            saved = 1 - results[1] / results[0]
+            print(f"{name:<16}{results[0]:>14.1f}{results[1]:>14.1f}{saved:>8.0%}")
+    finally:
+        session_store.delete_session(session_id)
+        audit.stop_writer()
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
@@ -0,0 +1,77 @@
+"""Offline check against a sorted, memory-mapped file of breached SHA-1 password hashes.
+
+File layout (little-endian), written by build_breached_passwords.py:
+
+    0   8 bytes   magic b"PWNDSHA1"
+    8   uint32    format version (1)
+    12  uint64    number of records
+    20  12 bytes  padding
+    32  65537 x uint64  prefix index: first record whose hash starts with
+                        each 2-byte prefix (last entry = record count)
+    ... 20-byte SHA-1 digests, sorted and unique
+
+Only the 512 KiB prefix index is copied into memory; records stay in the
+page cache and a lookup binary-searches one prefix bucket.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BREACHED_PASSWORDS_FILE = os.getenv("BREACHED_PASSWORDS_FILE")
+
+MAGIC = b"PWNDSHA1"
+VERSION = 1
+HEADER = struct.Struct("<8sIQ12x")
+PREFIX_COUNT = 1 << 16
+INDEX_OFFSET = HEADER.size
+RECORDS_OFFSET = INDEX_OFFSET + (PREFIX_COUNT + 1) * 8
+RECORD_SIZE = 20
+
+class BreachedPasswordIndex:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a breached-password index (version {VERSION})")
+        if len(self._mm) != RECORDS_OFFSET + self.count * RECORD_SIZE:
+            raise ValueError(f"{path} is truncated or corrupt")
+
+        self._prefix_index = array("Q")
+        self._prefix_index.frombytes(self._mm[INDEX_OFFSET:RECORDS_OFFSET])
+        if sys.byteorder == "big":
+            self._prefix_index.byteswap()
+
+    def contains_digest(self, digest: bytes) -> bool:
+        prefix = (digest[0] << 8) | digest[1]
+        lo, hi = self._prefix_index[prefix], self._prefix_index[prefix + 1]
+        mm = self._mm
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = RECORDS_OFFSET + mid * RECORD_SIZE
+            record = mm[start:start + RECORD_SIZE]
+            if record < digest:
+                lo = mid + 1
+            elif record > digest:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def contains_password(self, password: str) -> bool:
+        return self.contains_digest(hashlib.sha1(password.encode("utf-8")).digest())
+
+    def close(self):
+        self._mm.close()
+
+breached_index = BreachedPasswordIndex(BREACHED_PASSWORDS_FILE) if BREACHED_PASSWORDS_FILE else None
+
+def is_breached(password: str) -> bool:
+    """False when no BREACHED_PASSWORDS_FILE is configured"""
+    return breached_index is not None and breached_index.contains_password(password)
@@ -0,0 +1,79 @@
+"""Build the breached-password index used by breached_passwords.py.
+
+    python build_breached_passwords.py pwned-passwords-sha1-ordered-by-hash.txt breached.bin
+
+Input lines are "<40 hex SHA-1>[:count]" (the Have I Been Pwned format);
+blank lines are skipped. Input must be sorted by hash - use the
+"ordered by hash" download, or `sort` the file first - so the build
+streams and never holds the list in memory.
+"""
+import argparse
+import os
+import struct
+import sys
+
+from breached_passwords import HEADER, MAGIC, VERSION, PREFIX_COUNT, INDEX_OFFSET, RECORDS_OFFSET
+
+def build(input_paths, output_path):
+    tmp_path = output_path + ".tmp"
+
+    try:
+        count = _write_index(input_paths, tmp_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, output_path)
+    return count
+
+def _write_index(input_paths, tmp_path):
+    prefix_counts = [0] * PREFIX_COUNT
+    count = 0
+    previous = b""
+
+    with open(tmp_path, "wb") as out:
+        out.seek(RECORDS_OFFSET)
+        for input_path in input_paths:
+            with open(input_path, "rb") as f:
+                for line_number, line in enumerate(f, 1):
+                    hex_hash = line.split(b":", 1)[0].strip()
+                    if not hex_hash:
+                        continue
+                    try:
+                        digest = bytes.fromhex(hex_hash.decode("ascii"))
+                    except ValueError:
+                        digest = b""
+                    if len(digest) != 20:
+                        raise ValueError(f"{input_path}:{line_number}: not a SHA-1 hash")
+                    if digest < previous:
+                        raise ValueError(f"{input_path}:{line_number}: input is not sorted by hash")
+                    if digest == previous:
+                        continue
+                    out.write(digest)
+                    prefix_counts[(digest[0] << 8) | digest[1]] += 1
+                    previous = digest
+                    count += 1
+
+        # Prefix index: cumulative start position of every 2-byte bucket
+        offsets = [0] * (PREFIX_COUNT + 1)
+        for prefix in range(PREFIX_COUNT):
+            offsets[prefix + 1] = offsets[prefix] + prefix_counts[prefix]
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, VERSION, count))
+        out.seek(INDEX_OFFSET)
+        out.write(struct.pack(f"<{PREFIX_COUNT + 1}Q", *offsets))
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a breached-password index from sorted SHA-1 dumps")
+    parser.add_argument("inputs", nargs="+", help="text files of '<sha1>[:count]' lines, sorted by hash")
+    parser.add_argument("output", help="index file to write (set BREACHED_PASSWORDS_FILE to it)")
+    args = parser.parse_args()
+    try:
+        count = build(args.inputs, args.output)
+    except ValueError as e:
+        sys.exit(f"error: {e}")
+    print(f"Wrote {count:,} hashes to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,25 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime
+from sqlalchemy import create_engine, event, Column, Integer, String, Boolean, DateTime
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
+import asyncio
+import time
 
 SQLITE_DATABASE_URL = "sqlite:///./auth.db"
 
 engine = create_engine(SQLITE_DATABASE_URL, connect_args={"check_same_thread": False})
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Incremental auto-vacuum for the maintenance task; WAL so readers never block
+    the writer, and synchronous=NORMAL so commits skip the fsync (WAL checkpoints
+    still sync, so a crash can lose the last commits but not corrupt the file)"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -27,6 +41,15 @@ class OTPToken(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     is_used = Column(Boolean, default=False)
 
+class TrustedDevice(Base):
+    __tablename__ = "trusted_devices"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    email = Column(String, index=True)
+    token_hash = Column(String, unique=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, index=True)
+
 Base.metadata.create_all(bind=engine)
 
 def get_db():
@@ -34,4 +57,102 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+class WritePipeline:
+    """Single writer that applies queued write operations in grouped transactions.
+
+    Handlers `await write_pipeline.submit(op)` where op(db) performs its
+    inserts/updates on the session it is given and returns a plain value
+    (not an ORM object, which would be detached). Operations in a batch share
+    one session with autoflush off, so an op whose reads must see earlier ops'
+    writes should use an UPDATE statement or flush. While one batch is being
+    committed, new operations queue up and go out together in the next one,
+    so there is one commit per batch rather than one per request.
+    """
+
+    def __init__(self, session_factory, max_batch: int = 256):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self._queue = None
+        self._task = None
+        self.stats = {"operations": 0, "batches": 0, "fallback_batches": 0, "commit_seconds": 0.0, "max_batch_seen": 0}
+
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Finish queued operations, then stop the writer"""
+        if self._task is not None:
+            await self._queue.join()
+            self._task.cancel()
+            self._task = None
+
+    async def submit(self, op):
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((op, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                results = await asyncio.to_thread(self._apply, [op for op, _ in batch])
+            except Exception as e:
+                results = [(False, e)] * len(batch)
+            for (_, future), (ok, value) in zip(batch, results):
+                if not future.done():
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+                self._queue.task_done()
+
+    def _apply(self, ops):
+        """Run ops in one transaction; if any fails, redo them one transaction each
+        so a bad operation only fails its own caller"""
+        started = time.perf_counter()
+        db = self.session_factory()
+        try:
+            results = [(True, op(db)) for op in ops]
+            db.commit()
+        except Exception:
+            db.rollback()
+            results = None
+        finally:
+            db.close()
+
+        if results is None:
+            self.stats["fallback_batches"] += 1
+            results = [self._apply_one(op) for op in ops]
+
+        self.stats["operations"] += len(ops)
+        self.stats["batches"] += 1
+        self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(ops))
+        self.stats["commit_seconds"] += time.perf_counter() - started
+        return results
+
+    def _apply_one(self, op):
+        db = self.session_factory()
+        try:
+            value = op(db)
+            db.commit()
+            return True, value
+        except Exception as e:
+            db.rollback()
+            return False, e
+        finally:
+            db.close()
+
+    def get_stats(self):
+        result = dict(self.stats)
+        result["queue_depth"] = self._queue.qsize() if self._queue is not None else 0
+        result["avg_batch_size"] = result["operations"] / result["batches"] if result["batches"] else 0.0
+        return result
+
+write_pipeline = WritePipeline(SessionLocal)
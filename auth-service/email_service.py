@@ -7,6 +7,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+OTP_EXPIRE_MINUTES = 5
+
 def generate_otp():
     return str(random.randint(100000, 999999))
 
@@ -24,7 +26,7 @@ def send_otp_email(email: str, otp_code: str):
     body = f"""
     Your OTP code is: {otp_code}
     
-    This code will expire in 5 minutes.
+    This code will expire in {OTP_EXPIRE_MINUTES} minutes.
     
     If you didn't request this code, please ignore this email.
     """
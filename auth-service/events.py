@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+import uuid
+from collections import deque
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EVENT_BUFFER_SIZE = int(os.getenv("EVENT_BUFFER_SIZE", "1000"))
+EVENT_KEEPALIVE_SECONDS = 15
+# Shared with the apps: they send it to subscribe, and it keys the fingerprints
+EVENTS_SECRET = os.getenv("EVENTS_SECRET")
+# Without a secret nobody can subscribe, so any unguessable key will do
+_fingerprint_key = EVENTS_SECRET.encode() if EVENTS_SECRET else secrets.token_bytes(32)
+
+def fingerprint(value: str) -> str:
+    """HMAC-SHA256 of value keyed by EVENTS_SECRET; only holders of the secret can match it"""
+    return hmac.new(_fingerprint_key, value.encode(), hashlib.sha256).hexdigest()[:32]
+
+class EventBus:
+    """In-process fan-out of auth events with a replay buffer.
+
+    Event ids are "<boot>-<seq>"; a subscriber resuming from an id this
+    process cannot replay (restart, or fell out of the buffer) gets a
+    "reset" event first and must drop everything it has cached.
+    """
+
+    def __init__(self, size: int):
+        self.boot_id = uuid.uuid4().hex[:8]
+        self._events = deque(maxlen=size)
+        self._seq = 0
+        self._loop = None
+        self._wakeup = None
+
+    def bind(self, loop):
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    def publish(self, event_type: str, **data):
+        """Safe to call from the event loop or from worker threads"""
+        event = {"type": event_type, "ts": time.time(), **data}
+        if self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._append(event)
+        else:
+            self._loop.call_soon_threadsafe(self._append, event)
+
+    def _append(self, event):
+        self._seq += 1
+        event["id"] = f"{self.boot_id}-{self._seq}"
+        self._events.append((self._seq, event))
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+
+    def parse_id(self, event_id):
+        """Map an external event id to a local cursor; None means the caller must reset"""
+        if not event_id:
+            return self._seq
+        boot_id, _, seq = event_id.partition("-")
+        if boot_id != self.boot_id or not seq.isdigit() or int(seq) > self._seq:
+            return None
+        return int(seq)
+
+    def since(self, cursor):
+        """Return (events after cursor, reset, new cursor).
+
+        reset is set when cursor is None or older than the buffer; the
+        events are then everything still buffered.
+        """
+        if cursor is not None:
+            oldest = self._events[0][0] if self._events else self._seq + 1
+            if cursor >= oldest - 1:
+                return [event for seq, event in self._events if seq > cursor], False, self._seq
+        return [event for _, event in self._events], True, self._seq
+
+    def cursor_id(self, cursor) -> str:
+        return f"{self.boot_id}-{cursor}"
+
+    async def wait(self, cursor, timeout: float):
+        """Wait up to timeout for events after cursor"""
+        if cursor is not None and cursor >= self._seq:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.since(cursor)
+
+bus = EventBus(EVENT_BUFFER_SIZE)
+
+def format_sse(event) -> str:
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+async def sse_stream(request, last_event_id):
+    """Server-sent events: replay what the client missed, then push new events"""
+    cursor = bus.parse_id(last_event_id)
+    while not await request.is_disconnected():
+        events, reset, cursor = await bus.wait(cursor, EVENT_KEEPALIVE_SECONDS)
+        if reset:
+            # Carry an id so a reconnect resumes from here rather than resetting again
+            yield f"id: {bus.cursor_id(cursor)}\nevent: reset\ndata: {json.dumps({'type': 'reset'})}\n\n"
+        elif not events:
+            yield ": keepalive\n\n"
+        for event in events:
+            yield format_sse(event)
+
+async def long_poll(last_event_id, timeout: float):
+    """Long-poll alternative to the stream for clients that cannot hold a connection"""
+    events, reset, cursor = await bus.wait(bus.parse_id(last_event_id), timeout)
+    return {"events": events, "reset": reset, "last_event_id": bus.cursor_id(cursor)}
@@ -0,0 +1,17 @@
+import orjson
+from fastapi.responses import Response
+
+# Bodies for the hot endpoints' common replies, encoded once at import
+INVALID_TOKEN = orjson.dumps({"detail": "Invalid token"})
+NOT_AUTHENTICATED = orjson.dumps({"detail": "Not authenticated"})
+INVALID_CREDENTIALS = orjson.dumps({"detail": "Invalid authentication credentials"})
+
+def dumps(obj) -> bytes:
+    return orjson.dumps(obj)
+
+def loads(data: bytes):
+    return orjson.loads(data)
+
+def json_response(body: bytes, status_code: int = 200, headers: dict = None) -> Response:
+    """Send already-encoded JSON, skipping jsonable_encoder and response validation"""
+    return Response(content=body, status_code=status_code, headers=headers, media_type="application/json")
@@ -0,0 +1,204 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from dotenv import load_dotenv
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature, encode_dss_signature
+
+load_dotenv()
+
+JWT_KEYS_FILE = os.getenv("JWT_KEYS_FILE")
+DEFAULT_KID = "default"
+
+def b64url_encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+def b64url_decode(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+def _decode_segment(segment: bytes) -> bytes:
+    """Decode one token segment, accepting only its canonical unpadded base64url form.
+
+    urlsafe_b64decode also takes padding, "+" and "/", stray characters and
+    non-zero trailing bits, which would give one token many spellings that
+    all verify; anything keyed on the token string could then be bypassed.
+    """
+    data = b64url_decode(segment)
+    if b64url_encode(data) != segment:
+        raise ValueError("Token segment is not canonical base64url")
+    return data
+
+def _dumps(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+class SigningKey(ABC):
+    """A parsed key bound to one algorithm; header bytes are encoded once"""
+
+    alg = None
+
+    def __init__(self, kid: str):
+        self.kid = kid
+        header = {"alg": self.alg} if kid == DEFAULT_KID else {"alg": self.alg, "kid": kid}
+        self.encoded_header = b64url_encode(_dumps(header))
+
+    @property
+    def can_sign(self) -> bool:
+        return True
+
+    @abstractmethod
+    def sign(self, signing_input: bytes) -> bytes:
+        """Raw signature bytes (not base64url-encoded)"""
+
+    @abstractmethod
+    def verify(self, signing_input: bytes, signature: bytes) -> bool:
+        """True if signature is valid for signing_input under this key"""
+
+class HS256Key(SigningKey):
+    alg = "HS256"
+
+    def __init__(self, kid: str, secret: str):
+        self._secret = secret.encode()
+        super().__init__(kid)
+
+    def sign(self, signing_input):
+        return hmac.new(self._secret, signing_input, hashlib.sha256).digest()
+
+    def verify(self, signing_input, signature):
+        return hmac.compare_digest(self.sign(signing_input), signature)
+
+class _AsymmetricKey(SigningKey):
+    """Holds a private key for signing, or only a public key for verifying retired kids"""
+
+    def __init__(self, kid: str, private_key=None, public_key=None):
+        self._private_key = private_key
+        self._public_key = public_key if public_key is not None else private_key.public_key()
+        super().__init__(kid)
+
+    @property
+    def can_sign(self):
+        return self._private_key is not None
+
+class ES256Key(_AsymmetricKey):
+    alg = "ES256"
+
+    def sign(self, signing_input):
+        r, s = decode_dss_signature(self._private_key.sign(signing_input, ec.ECDSA(hashes.SHA256())))
+        return r.to_bytes(32, "big") + s.to_bytes(32, "big")
+
+    def verify(self, signing_input, signature):
+        if len(signature) != 64:
+            return False
+        der = encode_dss_signature(int.from_bytes(signature[:32], "big"), int.from_bytes(signature[32:], "big"))
+        try:
+            self._public_key.verify(der, signing_input, ec.ECDSA(hashes.SHA256()))
+            return True
+        except InvalidSignature:
+            return False
+
+class EdDSAKey(_AsymmetricKey):
+    alg = "EdDSA"
+
+    def sign(self, signing_input):
+        return self._private_key.sign(signing_input)
+
+    def verify(self, signing_input, signature):
+        try:
+            self._public_key.verify(signature, signing_input)
+            return True
+        except InvalidSignature:
+            return False
+
+def load_key(spec: dict) -> SigningKey:
+    """Build a key from a JWT_KEYS_FILE entry"""
+    kid, alg = spec["kid"], spec["alg"]
+    if alg == "HS256":
+        return HS256Key(kid, spec["secret"])
+
+    key_classes = {"ES256": (ES256Key, ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey),
+                   "EdDSA": (EdDSAKey, ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey)}
+    if alg not in key_classes:
+        raise ValueError(f"Unsupported JWT algorithm for kid {kid}: {alg}")
+    key_class, private_type, public_type = key_classes[alg]
+
+    if "private_key_file" in spec:
+        with open(spec["private_key_file"], "rb") as f:
+            private_key = serialization.load_pem_private_key(f.read(), password=None)
+        if not isinstance(private_key, private_type):
+            raise ValueError(f"Key for kid {kid} does not match algorithm {alg}")
+        return key_class(kid, private_key=private_key)
+
+    with open(spec["public_key_file"], "rb") as f:
+        public_key = serialization.load_pem_public_key(f.read())
+    if not isinstance(public_key, public_type):
+        raise ValueError(f"Key for kid {kid} does not match algorithm {alg}")
+    return key_class(kid, public_key=public_key)
+
+class KeyManager:
+    """Signs with the active key and verifies with whichever key the token's kid names"""
+
+    def __init__(self, keys, active_kid: str):
+        self.keys = {key.kid: key for key in keys}
+        self.active = self.keys[active_kid]
+        if not self.active.can_sign:
+            raise ValueError(f"Active kid {active_kid} has no private key")
+
+    def encode(self, claims: dict) -> str:
+        key = self.active
+        signing_input = key.encoded_header + b"." + b64url_encode(_dumps(claims))
+        return (signing_input + b"." + b64url_encode(key.sign(signing_input))).decode()
+
+    def decode(self, token: str):
+        """Return the claims of a valid, unexpired token, else None"""
+        try:
+            encoded_header, encoded_claims, encoded_signature = token.encode().split(b".")
+            header = json.loads(_decode_segment(encoded_header))
+            key = self.keys.get(header.get("kid", DEFAULT_KID))
+            # The key decides the algorithm; the header only has to agree with it
+            if key is None or header.get("alg") != key.alg:
+                return None
+            if not key.verify(encoded_header + b"." + encoded_claims, _decode_segment(encoded_signature)):
+                return None
+            claims = json.loads(_decode_segment(encoded_claims))
+        except (ValueError, TypeError, AttributeError):
+            return None
+        if not isinstance(claims, dict):
+            return None
+        exp = claims.get("exp")
+        if exp is not None and (not isinstance(exp, (int, float)) or exp < time.time()):
+            return None
+        return claims
+
+def load_key_manager() -> KeyManager:
+    """Read JWT_KEYS_FILE, or fall back to SECRET_KEY/ALGORITHM as the single HS256 key.
+
+    JWT_KEYS_FILE format:
+        {"active_kid": "2024-06",
+         "keys": [{"kid": "2024-06", "alg": "EdDSA", "private_key_file": "ed25519.pem"},
+                  {"kid": "2024-01", "alg": "ES256", "public_key_file": "old-es256.pub.pem"},
+                  {"kid": "default", "alg": "HS256", "secret": "..."}]}
+
+    The "default" kid also verifies tokens issued before kids were used.
+    """
+    if JWT_KEYS_FILE:
+        with open(JWT_KEYS_FILE) as f:
+            config = json.load(f)
+        return KeyManager([load_key(spec) for spec in config["keys"]], config["active_kid"])
+
+    algorithm = os.getenv("ALGORITHM", "HS256")
+    if algorithm != "HS256":
+        raise ValueError("Without JWT_KEYS_FILE only ALGORITHM=HS256 is supported")
+    return KeyManager([HS256Key(DEFAULT_KID, os.getenv("SECRET_KEY"))], DEFAULT_KID)
+
+key_manager = load_key_manager()
+
+def reload_keys():
+    """Re-read the key configuration so kids can be rotated without a restart"""
+    global key_manager
+    key_manager = load_key_manager()
+    return key_manager
@@ -1,27 +1,89 @@
-from fastapi import FastAPI, Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Header, status
+from fastapi.responses import PlainTextResponse, StreamingResponse, ORJSONResponse
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials, APIKeyHeader
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
 import json
 import uuid
-from pathlib import Path
+import hmac
+import asyncio
 
-from database import get_db, User, OTPToken
-from models import UserCreate, UserLogin, OTPVerify, Token
-from auth import verify_password, get_password_hash, create_access_token, verify_token
-from email_service import generate_otp, send_otp_email
+from database import get_db, write_pipeline, User, OTPToken
+from models import UserCreate, UserLogin, OTPVerify, Token, RevokeUser
+from auth import verify_password, get_password_hash, create_access_token, verify_token, get_token_claims
+from email_service import generate_otp, send_otp_email, OTP_EXPIRE_MINUTES
+import maintenance
+import user_cache
+import profiling
+import admission
+import keys
+import user_export
+import trusted_devices
+import events
+import revocation
+import audit
+import breached_passwords
+import fast_json
+import session_store
 
 load_dotenv()
 
-app = FastAPI(title="Authentication Service")
+app = FastAPI(title="Authentication Service", default_response_class=ORJSONResponse)
 security = HTTPBearer()
+admin_key_header = APIKeyHeader(name="X-Admin-Key", auto_error=False)
+events_key_header = APIKeyHeader(name="X-Events-Key", auto_error=False)
+
+app.add_middleware(audit.AuditMiddleware)
+if profiling.PROFILING_ENABLED:
+    app.add_middleware(profiling.ProfileMiddleware)
+# Added last so it is the outermost middleware and sheds before any other work
+app.add_middleware(admission.AdmissionMiddleware)
 
 COMPANY_DOMAIN = os.getenv("COMPANY_DOMAIN")
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+
+def require_admin(admin_key: str = Depends(admin_key_header)):
+    """Admin endpoints are disabled unless ADMIN_API_KEY is set"""
+    if not ADMIN_API_KEY or not admin_key or not hmac.compare_digest(admin_key, ADMIN_API_KEY):
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+def require_events_key(events_key: str = Depends(events_key_header)):
+    """The event stream is closed unless EVENTS_SECRET is set; apps send the same secret"""
+    if not events.EVENTS_SECRET or not events_key or not hmac.compare_digest(events_key, events.EVENTS_SECRET):
+        raise HTTPException(status_code=403, detail="Event stream access required")
+
+@app.on_event("startup")
+async def start_background_tasks():
+    events.bus.bind(asyncio.get_running_loop())
+    audit.start_writer()
+    write_pipeline.start()
+    await asyncio.to_thread(user_cache.load_email_filter)
+    app.state.maintenance_task = asyncio.create_task(maintenance.maintenance_loop())
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await write_pipeline.stop()
+    await asyncio.to_thread(audit.stop_writer)
+
+def consume_otp(db, email: str, otp_code: str, created_after: datetime) -> int:
+    """Mark a matching unused OTP as used in one UPDATE; returns how many rows changed.
+
+    Checking and marking in one statement means the same code cannot be
+    consumed twice, even by two requests in the same write batch.
+    """
+    return db.query(OTPToken).filter(
+        OTPToken.email == email,
+        OTPToken.otp_code == otp_code,
+        OTPToken.created_at > created_after,
+        OTPToken.is_used == False
+    ).update({OTPToken.is_used: True}, synchronize_session=False)
 
 @app.post("/register")
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, request: Request, db: Session = Depends(get_db)):
+    request.state.audit_email = user.email
     # Check if email domain is allowed
     email_domain = user.email.split("@")[1]
     if email_domain != COMPANY_DOMAIN:
@@ -30,88 +92,147 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
             detail=f"Registration only allowed for {COMPANY_DOMAIN} domain"
         )
     
-    # Check if user already exists
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
+    # Reject passwords that appear in known breaches
+    if breached_passwords.is_breached(user.password):
+        raise HTTPException(
+            status_code=400,
+            detail="This password has appeared in a data breach, please choose another"
+        )
+    
+    # Check if user already exists (skipped when the email filter rules it out)
+    if user_cache.get_user(db, user.email):
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    # Create new user
-    hashed_password = get_password_hash(user.password)
-    db_user = User(email=user.email, hashed_password=hashed_password)
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    # Create new user; the unique index still catches a concurrent duplicate.
+    # bcrypt runs on a worker thread (sampled when profiling) so it does not
+    # stall the event loop
+    hashed_password = await profiling.to_thread(get_password_hash, user.password)
+    try:
+        await write_pipeline.submit(
+            lambda write_db: write_db.add(User(email=user.email, hashed_password=hashed_password))
+        )
+    except IntegrityError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    user_cache.user_registered(user.email)
     
     return {"message": "User registered successfully"}
 
 @app.post("/login")
-async def login(user: UserLogin, db: Session = Depends(get_db)):
+async def login(user: UserLogin, request: Request, db: Session = Depends(get_db)):
+    request.state.audit_email = user.email
     # Verify user credentials
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+    db_user = user_cache.get_user(db, user.email)
+    if not db_user or not await profiling.to_thread(verify_password, user.password, db_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
+    # A device that already passed 2FA skips the OTP round trip
+    if user.device_token and trusted_devices.is_trusted_device(db, user.email, user.device_token):
+        access_token_expires = timedelta(minutes=int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")))
+        access_token = create_access_token(
+            data={"sub": user.email}, expires_delta=access_token_expires
+        )
+        return {"message": "Trusted device", "access_token": access_token, "token_type": "bearer"}
+    
     # Generate and send OTP
     otp_code = generate_otp()
     
     # Store OTP in database
-    otp_token = OTPToken(email=user.email, otp_code=otp_code)
-    db.add(otp_token)
-    db.commit()
+    await write_pipeline.submit(
+        lambda write_db: write_db.add(OTPToken(email=user.email, otp_code=otp_code))
+    )
     
     # Send OTP via email
-    if not send_otp_email(user.email, otp_code):
+    if not await profiling.to_thread(send_otp_email, user.email, otp_code):
         raise HTTPException(status_code=500, detail="Failed to send OTP email")
     
     return {"message": "OTP sent to your email"}
 
 @app.post("/verify-otp", response_model=Token)
-async def verify_otp(otp_data: OTPVerify, db: Session = Depends(get_db)):
-    # Check OTP validity (within 5 minutes)
-    five_minutes_ago = datetime.utcnow() - timedelta(minutes=5)
-    otp_token = db.query(OTPToken).filter(
-        OTPToken.email == otp_data.email,
-        OTPToken.otp_code == otp_data.otp_code,
-        OTPToken.created_at > five_minutes_ago,
-        OTPToken.is_used == False
-    ).first()
-    
-    if not otp_token:
+async def verify_otp(otp_data: OTPVerify, request: Request):
+    request.state.audit_email = otp_data.email
+    # Check OTP validity (within OTP_EXPIRE_MINUTES) and mark it used
+    otp_cutoff = datetime.utcnow() - timedelta(minutes=OTP_EXPIRE_MINUTES)
+    if not await write_pipeline.submit(
+        lambda write_db: consume_otp(write_db, otp_data.email, otp_data.otp_code, otp_cutoff)
+    ):
         raise HTTPException(status_code=400, detail="Invalid or expired OTP")
     
-    # Mark OTP as used
-    otp_token.is_used = True
-    db.commit()
-    
     # Create access token
     access_token_expires = timedelta(minutes=int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")))
     access_token = create_access_token(
         data={"sub": otp_data.email}, expires_delta=access_token_expires
     )
     
-    return {"access_token": access_token, "token_type": "bearer"}
+    # Optionally remember this device so the next login can skip the OTP
+    device_token = None
+    if otp_data.remember_device:
+        device_token = await trusted_devices.issue_device_token(otp_data.email)
+    
+    return {"access_token": access_token, "token_type": "bearer", "device_token": device_token}
 
 @app.get("/verify-token")
-async def verify_user_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    email = verify_token(credentials.credentials)
+async def verify_user_token(request: Request):
+    """Hot path: parses the bearer header itself and answers with pre-encoded JSON"""
+    authorization = request.headers.get("authorization")
+    if not authorization:
+        return fast_json.json_response(fast_json.NOT_AUTHENTICATED, status.HTTP_403_FORBIDDEN)
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return fast_json.json_response(fast_json.INVALID_CREDENTIALS, status.HTTP_403_FORBIDDEN)
+    
+    email = verify_token(token)
     if email is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token"
-        )
-    return {"email": email}
+        return fast_json.json_response(fast_json.INVALID_TOKEN, status.HTTP_401_UNAUTHORIZED)
+    return fast_json.json_response(fast_json.dumps({"email": email}))
+
+
+@app.post("/logout")
+async def logout(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Revoke the presented token and tell subscribed apps to drop it"""
+    claims = get_token_claims(credentials.credentials)
+    if claims is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    request.state.audit_email = claims["sub"]
+    
+    revocation.revoke_token(credentials.credentials, claims)
+    events.bus.publish(
+        "logout",
+        token=events.fingerprint(credentials.credentials),
+        email=events.fingerprint(claims["sub"].lower()),
+    )
+    return {"message": "Logged out"}
+
+@app.get("/events", dependencies=[Depends(require_events_key)])
+async def auth_events(request: Request, last_event_id: str = Header(None)):
+    """Server-sent stream of logout, revoked and session_expired events.
+
+    Requires X-Events-Key. Tokens, emails and session ids appear only as
+    HMAC fingerprints keyed by EVENTS_SECRET.
+    Reconnect with Last-Event-ID to replay missed events; a "reset" event
+    means some were lost and cached auth state must be dropped.
+    """
+    return StreamingResponse(
+        events.sse_stream(request, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
 
+@app.get("/events/poll", dependencies=[Depends(require_events_key)])
+async def poll_auth_events(last_event_id: str = None, timeout: float = Query(25, ge=0, le=60)):
+    """Long-poll variant of /events; pass back last_event_id from the previous reply"""
+    return await events.long_poll(last_event_id, timeout)
 
 @app.post("/create-session")
-async def create_session(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def create_session(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Create a shared session that can be used across apps"""
     try:
         email = verify_token(credentials.credentials)
         if email is None:
             raise HTTPException(status_code=401, detail="Invalid token")
+        request.state.audit_email = email
         
         # Create a session ID
         session_id = str(uuid.uuid4())
@@ -124,44 +245,43 @@ async def create_session(credentials: HTTPAuthorizationCredentials = Depends(sec
             "expires_at": (datetime.utcnow() + timedelta(minutes=30)).isoformat()
         }
         
-        # Create sessions directory if it doesn't exist
-        sessions_dir = Path("sessions")
-        sessions_dir.mkdir(exist_ok=True)
+        # Save session to file (and the in-memory session cache)
+        session_file = session_store.save_session(session_id, session_data)
         
-        # Save session to file
-        session_file = sessions_dir / f"{session_id}.json"
-        with open(session_file, 'w') as f:
-            json.dump(session_data, f)
-
-            
         # ✅ Debug log
         print(f"[DEBUG] Writing session to: {session_file.resolve()}")
         
         return {"session_id": session_id}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Session creation error: {e}")
         raise HTTPException(status_code=500, detail="Failed to create session")
 
 @app.get("/get-session/{session_id}")
-async def get_session(session_id: str):
+async def get_session(session_id: str, request: Request):
     """Retrieve session data by session ID"""
     try:
-        session_file = Path("sessions") / f"{session_id}.json"
-        
-        if not session_file.exists():
+        session = session_store.load_session(session_id)
+        if session is None:
             raise HTTPException(status_code=404, detail="Session not found")
-        
-        with open(session_file, 'r') as f:
-            session_data = json.load(f)
+        request.state.audit_email = session.email
         
         # Check if session is expired
-        expires_at = datetime.fromisoformat(session_data["expires_at"])
-        if datetime.utcnow() > expires_at:
+        if datetime.utcnow() > session.expires_at:
             # Clean up expired session
-            session_file.unlink()
+            session_store.delete_session(session_id)
+            events.bus.publish("session_expired", session=events.fingerprint(session_id))
             raise HTTPException(status_code=401, detail="Session expired")
         
-        return session_data
+        # A session carrying a logged-out or revoked token is dead too
+        if verify_token(session.token) is None:
+            session_store.delete_session(session_id)
+            events.bus.publish("session_expired", session=events.fingerprint(session_id))
+            raise HTTPException(status_code=401, detail="Session revoked")
+        
+        # Send the stored JSON as-is rather than parsing and re-encoding it
+        return fast_json.json_response(session.body)
     except HTTPException:
         raise
     except Exception as e:
@@ -172,7 +292,7 @@ async def get_session(session_id: str):
 async def cleanup_expired_sessions():
     """Clean up expired sessions (can be called periodically)"""
     try:
-        sessions_dir = Path("sessions")
+        sessions_dir = session_store.SESSIONS_DIR
         if not sessions_dir.exists():
             return {"message": "No sessions directory"}
         
@@ -184,19 +304,149 @@ async def cleanup_expired_sessions():
                 
                 expires_at = datetime.fromisoformat(session_data["expires_at"])
                 if datetime.utcnow() > expires_at:
-                    session_file.unlink()
+                    session_store.delete_session(session_file.stem)
+                    events.bus.publish("session_expired", session=events.fingerprint(session_file.stem))
                     cleaned += 1
             except Exception:
                 # If we can't read the file, delete it
-                session_file.unlink()
+                session_store.delete_session(session_file.stem)
                 cleaned += 1
         
         return {"message": f"Cleaned up {cleaned} expired sessions"}
     except Exception as e:
         print(f"Session cleanup error: {e}")
         return {"message": "Cleanup failed"}
+
+@app.get("/admin/maintenance/stats", dependencies=[Depends(require_admin)])
+async def maintenance_stats():
+    """Rows reclaimed and time spent by the background maintenance task"""
+    return await asyncio.to_thread(maintenance.get_stats)
+
+@app.post("/admin/maintenance/enable-incremental-vacuum", dependencies=[Depends(require_admin)])
+async def enable_incremental_vacuum():
+    """One-time conversion of an existing auth.db; rewrites the file under the write lock"""
+    return await asyncio.to_thread(maintenance.enable_incremental_vacuum)
+
+@app.get("/admin/user-cache/stats", dependencies=[Depends(require_admin)])
+async def user_cache_stats():
+    """Hit and miss counters for the user cache and email filter"""
+    return user_cache.get_stats()
+
+@app.get("/admin/admission/stats", dependencies=[Depends(require_admin)])
+async def admission_stats():
+    """Per-route in-flight, queue depth and shed counters"""
+    return admission.controller.stats()
+
+@app.post("/admin/revoke-user", dependencies=[Depends(require_admin)])
+async def revoke_user(data: RevokeUser):
+    """Invalidate every token issued to a user so far and forget their trusted devices"""
+    revocation.revoke_user(data.email)
+    devices_removed = await trusted_devices.forget_devices(data.email)
+    events.bus.publish("revoked", email=events.fingerprint(data.email.lower()))
+    return {"message": "User tokens revoked", "trusted_devices_removed": devices_removed}
+
+@app.post("/admin/keys/reload", dependencies=[Depends(require_admin)])
+async def reload_signing_keys():
+    """Pick up a rotated JWT_KEYS_FILE; tokens signed by still-listed kids stay valid"""
+    try:
+        key_manager = keys.reload_keys()
+    except Exception as e:
+        print(f"Key reload error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to reload keys")
+    return {"active_kid": key_manager.active.kid, "kids": sorted(key_manager.keys)}
+
+@app.get("/admin/users", dependencies=[Depends(require_admin)])
+async def list_users(
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    """Keyset-paginated user listing; pass next_after_id as after_id for the next page"""
+    return user_export.list_users(db, after_id, limit)
+
+@app.get("/admin/users/export", dependencies=[Depends(require_admin)])
+async def export_users(format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    """Stream every user as NDJSON or CSV without loading the table into memory"""
+    if format == "csv":
+        return StreamingResponse(
+            user_export.export_csv(), media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="users.csv"'},
+        )
+    return StreamingResponse(
+        user_export.export_ndjson(), media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="users.ndjson"'},
+    )
+
+@app.get("/admin/audit", dependencies=[Depends(require_admin)])
+async def query_audit_events(
+    email: str = None,
+    since: datetime = None,
+    until: datetime = None,
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Audit events by user and time range (UTC), paged with after_id"""
+    return await asyncio.to_thread(audit.query_events, email, since, until, after_id, limit)
+
+@app.get("/admin/audit/export", dependencies=[Depends(require_admin)])
+async def export_audit_events(email: str = None, since: datetime = None, until: datetime = None):
+    """Stream matching audit events as NDJSON"""
+    return StreamingResponse(
+        audit.export_ndjson(email, since, until), media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="audit.ndjson"'},
+    )
+
+@app.get("/admin/audit/stats", dependencies=[Depends(require_admin)])
+async def audit_stats():
+    """Queue depth, dropped events and group-commit counters"""
+    return audit.get_stats()
+
+@app.get("/admin/write-pipeline/stats", dependencies=[Depends(require_admin)])
+async def write_pipeline_stats():
+    """Batch sizes, fallbacks and time spent committing"""
+    return write_pipeline.get_stats()
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """Recently captured request profiles (newest last)"""
+    return profiling.list_profiles()
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def download_profile(profile_id: str):
+    """Download a profile as collapsed stacks for flamegraph.pl or speedscope"""
+    folded = profiling.folded_profile(profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(
+        folded, headers={"Content-Disposition": f'attachment; filename="{profile_id}.folded"'}
+    )
     
 
-if __name__ == "__main__":
+def serve_tcp_and_unix_socket(uds_path: str):
+    """Serve the app on port 8000 and on a Unix socket for apps on the same host"""
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    
+    servers = [
+        uvicorn.Server(uvicorn.Config(app, host="0.0.0.0", port=8000)),
+        # Startup/shutdown handlers must run once, so only the TCP server runs the lifespan
+        uvicorn.Server(uvicorn.Config(app, uds=uds_path, lifespan="off")),
+    ]
+    
+    # Each server installs its own signal handlers and the last one wins; stop both
+    def handle_exit(sig, frame):
+        for server in servers:
+            uvicorn.Server.handle_exit(server, sig, frame)
+    for server in servers:
+        server.handle_exit = handle_exit
+    
+    async def serve_all():
+        await asyncio.gather(*(server.serve() for server in servers))
+    asyncio.run(serve_all())
+
+if __name__ == "__main__":
+    uds_path = os.getenv("AUTH_SERVICE_UDS")
+    if uds_path:
+        serve_tcp_and_unix_socket(uds_path)
+    else:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,171 @@
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import or_, select
+from dotenv import load_dotenv
+
+from database import SessionLocal, engine, OTPToken, TrustedDevice
+from email_service import OTP_EXPIRE_MINUTES
+
+load_dotenv()
+
+MAINTENANCE_INTERVAL_SECONDS = int(os.getenv("MAINTENANCE_INTERVAL_SECONDS", "300"))
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "500"))
+VACUUM_PAGES = int(os.getenv("VACUUM_PAGES", "1000"))
+ANALYZE_EVERY_RUNS = int(os.getenv("ANALYZE_EVERY_RUNS", "12"))
+
+stats = {
+    "runs": 0,
+    "otp_rows_purged": 0,
+    "device_rows_purged": 0,
+    "purge_batches": 0,
+    "purge_seconds": 0.0,
+    "vacuum_seconds": 0.0,
+    "analyze_runs": 0,
+    "analyze_seconds": 0.0,
+    "last_run_at": None,
+    "last_error": None,
+}
+
+def _purge_in_batches(model, condition, batch_size: int):
+    """Delete rows matching condition, one short transaction per batch"""
+    total = 0
+    while True:
+        db = SessionLocal()
+        try:
+            batch_ids = select(model.id).where(condition).limit(batch_size)
+            deleted = db.query(model).filter(
+                model.id.in_(batch_ids)
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+        total += deleted
+        stats["purge_batches"] += 1
+        if deleted < batch_size:
+            return total
+        # Give waiting writers a chance at the database lock between batches
+        time.sleep(0.01)
+
+def purge_otp_tokens(batch_size: int = PURGE_BATCH_SIZE):
+    """Delete used and expired OTP rows"""
+    cutoff = datetime.utcnow() - timedelta(minutes=OTP_EXPIRE_MINUTES)
+    return _purge_in_batches(
+        OTPToken, or_(OTPToken.is_used == True, OTPToken.created_at <= cutoff), batch_size
+    )
+
+def purge_trusted_devices(batch_size: int = PURGE_BATCH_SIZE):
+    """Delete expired trusted-device rows"""
+    return _purge_in_batches(
+        TrustedDevice, TrustedDevice.expires_at <= datetime.utcnow(), batch_size
+    )
+
+def _run_pragma(sql: str):
+    """Run maintenance SQL on a raw connection, stepping it to completion"""
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql)
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.commit()
+        return rows
+    finally:
+        conn.close()
+
+def auto_vacuum_mode() -> str:
+    return {0: "none", 1: "full", 2: "incremental"}.get(_run_pragma("PRAGMA auto_vacuum")[0][0], "unknown")
+
+def enable_incremental_vacuum():
+    """One-time switch of an existing database file to incremental auto-vacuum.
+
+    Needs a full VACUUM, which rewrites the file and holds the write lock
+    throughout, so it is never run automatically: run it offline
+    (`python maintenance.py enable-incremental-vacuum`) or via
+    POST /admin/maintenance/enable-incremental-vacuum in a quiet period.
+    Expired rows are purged first so the rewrite does not copy them.
+    """
+    if auto_vacuum_mode() == "incremental":
+        return {"auto_vacuum": "incremental", "converted": False}
+    otp_rows = purge_otp_tokens()
+    device_rows = purge_trusted_devices()
+    stats["otp_rows_purged"] += otp_rows
+    stats["device_rows_purged"] += device_rows
+
+    started = time.perf_counter()
+    _run_pragma("PRAGMA auto_vacuum=INCREMENTAL")
+    _run_pragma("VACUUM")
+    return {
+        "auto_vacuum": auto_vacuum_mode(),
+        "converted": True,
+        "otp_rows_purged": otp_rows,
+        "device_rows_purged": device_rows,
+        "vacuum_seconds": round(time.perf_counter() - started, 3),
+    }
+
+def incremental_vacuum(pages: int = VACUUM_PAGES):
+    """Release up to pages free pages; a no-op until incremental auto-vacuum is enabled"""
+    _run_pragma(f"PRAGMA incremental_vacuum({int(pages)})")
+
+def analyze():
+    _run_pragma("ANALYZE")
+
+def run_maintenance_cycle():
+    """Run one purge / vacuum / analyze pass and update the counters"""
+    started = time.perf_counter()
+    stats["otp_rows_purged"] += purge_otp_tokens()
+    stats["device_rows_purged"] += purge_trusted_devices()
+    stats["purge_seconds"] += time.perf_counter() - started
+
+    started = time.perf_counter()
+    incremental_vacuum()
+    stats["vacuum_seconds"] += time.perf_counter() - started
+
+    if stats["runs"] % ANALYZE_EVERY_RUNS == 0:
+        started = time.perf_counter()
+        analyze()
+        stats["analyze_runs"] += 1
+        stats["analyze_seconds"] += time.perf_counter() - started
+
+    stats["runs"] += 1
+    stats["last_run_at"] = datetime.utcnow().isoformat()
+
+async def maintenance_loop():
+    """Background task started with the app; database work runs off the event loop"""
+    if await asyncio.to_thread(auto_vacuum_mode) != "incremental":
+        print("auth.db does not use incremental auto-vacuum; free pages will not be released "
+              "until `python maintenance.py enable-incremental-vacuum` is run")
+
+    while True:
+        try:
+            await asyncio.to_thread(run_maintenance_cycle)
+            stats["last_error"] = None
+        except Exception as e:
+            stats["last_error"] = str(e)
+            print(f"Maintenance error: {e}")
+        await asyncio.sleep(MAINTENANCE_INTERVAL_SECONDS)
+
+def get_stats():
+    result = dict(stats)
+    page_size = _run_pragma("PRAGMA page_size")[0][0]
+    result["db_pages"] = _run_pragma("PRAGMA page_count")[0][0]
+    result["db_free_pages"] = _run_pragma("PRAGMA freelist_count")[0][0]
+    result["db_size_bytes"] = result["db_pages"] * page_size
+    result["auto_vacuum"] = auto_vacuum_mode()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline maintenance for auth.db (stop the service first)")
+    parser.add_argument("command", choices=["enable-incremental-vacuum", "run-cycle"])
+    args = parser.parse_args()
+    if args.command == "enable-incremental-vacuum":
+        print(enable_incremental_vacuum())
+    else:
+        run_maintenance_cycle()
+        print(get_stats())
+
+if __name__ == "__main__":
+    main()
@@ -8,14 +8,20 @@ class UserCreate(BaseModel):
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
+    device_token: Optional[str] = None
 
 class OTPVerify(BaseModel):
     email: EmailStr
     otp_code: str
+    remember_device: bool = False
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+    device_token: Optional[str] = None
+
+class RevokeUser(BaseModel):
+    email: EmailStr
 
 class TokenData(BaseModel):
     email: Optional[str] = None
\ No newline at end of file
@@ -0,0 +1,141 @@
+import asyncio
+import contextvars
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Nothing in this module runs unless PROFILING_ENABLED is set; main.py only
+# installs the middleware in that case.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "50"))
+PROFILE_TRUSTED_HOSTS = set(
+    host.strip() for host in os.getenv("PROFILE_TRUSTED_HOSTS", "127.0.0.1,::1").split(",") if host.strip()
+)
+PROFILE_HEADER = b"x-debug-profile"
+
+profiles = deque(maxlen=PROFILE_BUFFER_SIZE)
+# The sampler of the request being profiled, inherited by to_thread workers
+_active_sampler = contextvars.ContextVar("active_sampler", default=None)
+
+class StackSampler(threading.Thread):
+    """Periodically records the stacks of the loop thread and any registered
+    worker threads as folded call paths, rooted at "loop" or "worker"."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._workers = set()
+        self._workers_lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def add_worker(self, thread_id: int):
+        with self._workers_lock:
+            self._workers.add(thread_id)
+
+    def remove_worker(self, thread_id: int):
+        with self._workers_lock:
+            self._workers.discard(thread_id)
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            with self._workers_lock:
+                workers = list(self._workers)
+            frames = sys._current_frames()
+            for root, thread_id in [("loop", self.thread_id)] + [("worker", worker) for worker in workers]:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(root)
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+def should_profile(scope) -> bool:
+    client = scope.get("client")
+    if client and client[0] in PROFILE_TRUSTED_HOSTS:
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER and value:
+                return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+def _run_sampled(func, *args):
+    sampler = _active_sampler.get()
+    if sampler is None:
+        return func(*args)
+    thread_id = threading.get_ident()
+    sampler.add_worker(thread_id)
+    try:
+        return func(*args)
+    finally:
+        sampler.remove_worker(thread_id)
+
+async def to_thread(func, *args):
+    """asyncio.to_thread that also samples the worker when the request is being profiled"""
+    return await asyncio.to_thread(_run_sampled, func, *args)
+
+class ProfileMiddleware:
+    """Plain ASGI middleware: samples selected requests' loop thread and to_thread workers.
+
+    Handlers run on the loop thread, so concurrent requests can show up in
+    each other's "loop" samples; profile on a quiet instance for clean attribution.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        sampler = StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+        started_at = datetime.utcnow().isoformat()
+        started = time.perf_counter()
+        sampler.start()
+        token = _active_sampler.set(sampler)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _active_sampler.reset(token)
+            sampler.stop()
+            profiles.append({
+                "id": uuid.uuid4().hex,
+                "method": scope["method"],
+                "path": scope["path"],
+                "started_at": started_at,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                "samples": sampler.samples,
+            })
+
+def list_profiles():
+    return [
+        {key: value for key, value in profile.items() if key != "samples"} | {"sample_count": sum(profile["samples"].values())}
+        for profile in profiles
+    ]
+
+def folded_profile(profile_id: str):
+    """Return a profile in collapsed-stack format (flamegraph.pl, speedscope), or None"""
+    for profile in profiles:
+        if profile["id"] == profile_id:
+            return "".join(f"{stack} {count}\n" for stack, count in profile["samples"].most_common())
+    return None
@@ -0,0 +1,42 @@
+import hashlib
+import time
+
+# Revocations live in memory in this process and are forgotten on restart;
+# access tokens are short-lived, so the exposure is bounded by
+# ACCESS_TOKEN_EXPIRE_MINUTES.
+_revoked_tokens = {}
+_revoked_before = {}
+_next_prune = 1024
+
+def token_fingerprint(token: str) -> str:
+    """Identifies a token in the revocation list without keeping it"""
+    return hashlib.sha256(token.encode()).hexdigest()[:32]
+
+def _revocation_key(token: str, claims: dict) -> str:
+    """The token's jti; tokens issued before jti existed fall back to their
+    (canonical, see keys._decode_segment) string"""
+    jti = claims.get("jti")
+    return f"jti:{jti}" if isinstance(jti, str) and jti else token_fingerprint(token)
+
+def revoke_token(token: str, claims: dict):
+    """Reject this token until it would have expired anyway"""
+    global _next_prune
+    exp = claims.get("exp")
+    _revoked_tokens[_revocation_key(token, claims)] = exp if exp is not None else float("inf")
+    if len(_revoked_tokens) >= _next_prune:
+        now = time.time()
+        for fingerprint, expires in list(_revoked_tokens.items()):
+            if expires < now:
+                del _revoked_tokens[fingerprint]
+        _next_prune = max(1024, 2 * len(_revoked_tokens))
+
+def revoke_user(email: str):
+    """Reject every token for email issued up to now"""
+    _revoked_before[email.lower()] = time.time()
+
+def is_revoked(token: str, claims: dict) -> bool:
+    if _revocation_key(token, claims) in _revoked_tokens:
+        return True
+    cutoff = _revoked_before.get(str(claims.get("sub", "")).lower())
+    # Tokens without iat predate iat being issued, so they predate the cutoff too
+    return cutoff is not None and claims.get("iat", 0) <= cutoff
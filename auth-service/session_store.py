@@ -0,0 +1,52 @@
+import os
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+
+import fast_json
+
+load_dotenv()
+
+SESSIONS_DIR = Path("sessions")
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+
+# body is the session JSON exactly as stored, so reads can send it without re-encoding
+CachedSession = namedtuple("CachedSession", ["email", "token", "expires_at", "body"])
+
+_cache = OrderedDict()
+
+def _session_file(session_id: str) -> Path:
+    return SESSIONS_DIR / f"{session_id}.json"
+
+def _remember(session_id: str, body: bytes) -> CachedSession:
+    data = fast_json.loads(body)
+    session = CachedSession(data["email"], data["token"], datetime.fromisoformat(data["expires_at"]), body)
+    _cache[session_id] = session
+    _cache.move_to_end(session_id)
+    while len(_cache) > SESSION_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return session
+
+def save_session(session_id: str, session_data: dict) -> Path:
+    SESSIONS_DIR.mkdir(exist_ok=True)
+    body = fast_json.dumps(session_data)
+    session_file = _session_file(session_id)
+    session_file.write_bytes(body)
+    _remember(session_id, body)
+    return session_file
+
+def load_session(session_id: str):
+    """Return a CachedSession, reading and parsing the file only on a cache miss"""
+    session = _cache.get(session_id)
+    if session is not None:
+        _cache.move_to_end(session_id)
+        return session
+    session_file = _session_file(session_id)
+    if not session_file.exists():
+        return None
+    return _remember(session_id, session_file.read_bytes())
+
+def delete_session(session_id: str):
+    _cache.pop(session_id, None)
+    _session_file(session_id).unlink(missing_ok=True)
@@ -0,0 +1,31 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# The service modules are flat imports that read their settings and open
+# auth.db / audit.db relative to the working directory at import time, so
+# point them at a scratch directory before any test imports them.
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVICE_DIR))
+
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("COMPANY_DOMAIN", "example.com")
+os.chdir(tempfile.mkdtemp(prefix="auth-service-tests-"))
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """Sessions on a fresh auth.db with the service's schema and pragmas"""
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+
+    import database
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'auth.db'}", connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", database._set_sqlite_pragmas)
+    database.Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, Overloaded, RouteLimit
+
+def _controller(capacity=1, max_queue=10, timeout_ms=1000):
+    controller = AdmissionController(capacity)
+    read = RouteLimit("read", 10, max_queue, timeout_ms, 0)
+    write = RouteLimit("auth-write", 10, max_queue, timeout_ms, 2)
+    controller.add_route(read, "/verify-token")
+    controller.add_route(write, "/login")
+    return controller, read, write
+
+async def _settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+def test_route_for_matches_first_path_segment():
+    controller, read, write = _controller()
+    assert controller.route_for("/verify-token") is read
+    assert controller.route_for("/login") is write
+    assert controller.route_for("/get-session/abc") is None
+
+def test_reads_are_admitted_ahead_of_queued_writes():
+    async def run():
+        controller, read, write = _controller()
+        await controller.acquire(write, 1000)
+        order = []
+
+        async def request(route, name):
+            await controller.acquire(route, 1000)
+            order.append(name)
+            controller.release(route)
+
+        # The write queued first, but the read has the better priority
+        tasks = [asyncio.create_task(request(write, "write")), asyncio.create_task(request(read, "read"))]
+        await _settle()
+        assert controller.stats()["queued"] == 2
+        controller.release(write)
+        await asyncio.gather(*tasks)
+        return order, controller
+
+    order, controller = asyncio.run(run())
+    assert order == ["read", "write"]
+    assert controller.in_flight == 0
+
+def test_route_cap_lets_other_classes_through():
+    async def run():
+        controller = AdmissionController(4)
+        write = RouteLimit("auth-write", 1, 10, 1000, 2)
+        read = RouteLimit("read", 4, 10, 1000, 0)
+        await controller.acquire(write, 1000)
+        waiter = asyncio.create_task(controller.acquire(write, 1000))
+        await _settle()
+        # The write class is at its cap, but shared slots remain for reads
+        await controller.acquire(read, 1000)
+        assert not waiter.done()
+        controller.release(write)
+        await waiter
+        return controller, read, write
+
+    controller, read, write = asyncio.run(run())
+    assert (write.in_flight, read.in_flight, controller.in_flight) == (1, 1, 2)
+
+def test_waiter_past_deadline_is_shed():
+    async def run():
+        controller, read, write = _controller()
+        await controller.acquire(write, 1000)
+        with pytest.raises(Overloaded):
+            await controller.acquire(read, 20)
+        return controller, read
+
+    controller, read = asyncio.run(run())
+    assert read.shed_deadline == 1
+    assert read.queued == 0
+    assert controller.stats()["queued"] == 0
+
+def test_full_queue_sheds_immediately():
+    async def run():
+        controller, read, write = _controller(max_queue=1)
+        await controller.acquire(write, 1000)
+        waiter = asyncio.create_task(controller.acquire(read, 1000))
+        await _settle()
+        with pytest.raises(Overloaded):
+            await controller.acquire(read, 1000)
+        # A zero deadline never queues either
+        with pytest.raises(Overloaded):
+            await controller.acquire(write, 0)
+        waiter.cancel()
+        return read, write
+
+    read, write = asyncio.run(run())
+    assert read.shed_queue_full == 1
+    assert write.shed_queue_full == 1
+
+def test_cancelled_waiter_is_removed():
+    async def run():
+        controller, read, write = _controller()
+        await controller.acquire(write, 1000)
+        waiters = [asyncio.create_task(controller.acquire(read, 1000)) for _ in range(3)]
+        await _settle()
+        waiters[1].cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiters[1]
+        assert read.queued == 2
+        assert len(controller._waiters) == 2
+
+        # The remaining waiters are admitted in order, skipping the cancelled one
+        controller.release(write)
+        await waiters[0]
+        assert not waiters[2].done()
+        controller.release(read)
+        await waiters[2]
+        return controller, read
+
+    controller, read = asyncio.run(run())
+    assert controller.stats()["queued"] == 0
+    assert read.in_flight == 1 and controller.in_flight == 1
+    assert read.shed_deadline == 0
+
+def test_waiter_admitted_as_it_is_cancelled_returns_its_slot():
+    async def run():
+        controller, read, write = _controller()
+        await controller.acquire(write, 1000)
+        waiter = asyncio.create_task(controller.acquire(read, 1000))
+        await _settle()
+        # Hands the slot to the waiter, which has not resumed yet when it is cancelled
+        controller.release(write)
+        assert read.in_flight == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return controller, read
+
+    controller, read = asyncio.run(run())
+    assert read.in_flight == 0
+    assert controller.in_flight == 0
+    assert read.admitted == 1
@@ -0,0 +1,134 @@
+import base64
+import json
+import time
+
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+
+from keys import DEFAULT_KID, ES256Key, EdDSAKey, HS256Key, KeyManager, SigningKey, b64url_decode, b64url_encode
+
+# Issued by python-jose 3.3.0 before keys.py replaced it:
+# jwt.encode({"sub": "legacy@example.com", "exp": 4102444800}, "test-secret-key", algorithm="HS256")
+# Header is {"alg": "HS256", "typ": "JWT"} with no kid.
+JOSE_TOKEN = (
+    "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9"
+    ".eyJzdWIiOiJsZWdhY3lAZXhhbXBsZS5jb20iLCJleHAiOjQxMDI0NDQ4MDB9"
+    ".14CEs-AbBxw4Xq2cG2U7dx7TlEt8Xhb9GdZF3h-KyAo"
+)
+
+def _claims(**extra):
+    return {"sub": "someone@example.com", "exp": int(time.time()) + 300, **extra}
+
+def _sign(key, header, payload) -> str:
+    """Build a token by hand so tests can control header and payload exactly"""
+    signing_input = b64url_encode(json.dumps(header).encode()) + b"." + b64url_encode(json.dumps(payload).encode())
+    return (signing_input + b"." + b64url_encode(key.sign(signing_input))).decode()
+
+def _all_keys():
+    return [
+        HS256Key("hs", "hs-secret"),
+        ES256Key("es", private_key=ec.generate_private_key(ec.SECP256R1())),
+        EdDSAKey("ed", private_key=ed25519.Ed25519PrivateKey.generate()),
+    ]
+
+@pytest.fixture
+def manager():
+    return KeyManager(_all_keys(), "ed")
+
+@pytest.mark.parametrize("kid", ["hs", "es", "ed"])
+def test_round_trip(kid):
+    manager = KeyManager(_all_keys(), kid)
+    claims = _claims()
+    token = manager.encode(claims)
+    header = json.loads(b64url_decode(token.split(".")[0].encode()))
+    assert header == {"alg": manager.active.alg, "kid": kid}
+    assert manager.decode(token) == claims
+
+def test_verifies_tokens_signed_before_rotation():
+    all_keys = _all_keys()
+    token = KeyManager(all_keys, "hs").encode(_claims())
+    assert KeyManager(all_keys, "ed").decode(token) is not None
+
+def test_signing_key_is_abstract():
+    with pytest.raises(TypeError):
+        SigningKey("x")
+
+def test_rejects_alg_none(manager):
+    for header in ({"alg": "none"}, {"alg": "none", "kid": "hs"}, {"alg": "none", "kid": DEFAULT_KID}):
+        encoded = b64url_encode(json.dumps(header).encode()) + b"." + b64url_encode(json.dumps(_claims()).encode())
+        assert manager.decode(encoded.decode() + ".") is None
+
+def test_rejects_alg_kid_mismatch(manager):
+    # An HS256 token naming the EdDSA kid must not be checked with HMAC
+    token = _sign(manager.keys["hs"], {"alg": "HS256", "kid": "ed"}, _claims())
+    assert manager.decode(token) is None
+
+def test_rejects_unknown_kid(manager):
+    token = _sign(manager.keys["hs"], {"alg": "HS256", "kid": "nope"}, _claims())
+    assert manager.decode(token) is None
+
+def test_rejects_tampered_signature(manager):
+    encoded_header, encoded_claims, encoded_signature = manager.encode(_claims()).split(".")
+    signature = bytearray(b64url_decode(encoded_signature.encode()))
+    signature[0] ^= 1
+    token = f"{encoded_header}.{encoded_claims}.{b64url_encode(bytes(signature)).decode()}"
+    assert manager.decode(token) is None
+
+def test_rejects_tampered_claims(manager):
+    encoded_header, _, encoded_signature = manager.encode(_claims()).split(".")
+    forged = b64url_encode(json.dumps(_claims(sub="admin@example.com")).encode()).decode()
+    assert manager.decode(f"{encoded_header}.{forged}.{encoded_signature}") is None
+
+def test_rejects_expired_token(manager):
+    assert manager.decode(manager.encode(_claims(exp=int(time.time()) - 1))) is None
+
+def test_rejects_non_dict_payload(manager):
+    key = manager.keys["ed"]
+    for payload in (["someone@example.com"], "someone@example.com", 42, None):
+        assert manager.decode(_sign(key, {"alg": key.alg, "kid": key.kid}, payload)) is None
+
+def test_rejects_malformed_tokens(manager):
+    for token in ("", "a.b", "a.b.c.d", "!!!.???.***", manager.encode(_claims()) + "x"):
+        assert manager.decode(token) is None
+
+def _token_with_urlsafe_chars(manager):
+    """A valid token whose signature contains "-" or "_" (i.e. differs from standard base64)"""
+    for nonce in range(1000):
+        token = manager.encode(_claims(nonce=nonce))
+        if "-" in token.split(".")[2] or "_" in token.split(".")[2]:
+            return token
+    raise AssertionError("no token with - or _ in its signature")
+
+def _lenient_decode(token):
+    return [base64.urlsafe_b64decode(part + "==") for part in token.split(".")]
+
+def _respellings(token):
+    """Other strings that a lenient base64url decoder maps to the same bytes"""
+    encoded_header, encoded_claims, encoded_signature = token.split(".")
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+    # A 64-byte signature ends in a character with four unused low bits
+    last = encoded_signature[-1]
+    trailing_bits = encoded_signature[:-1] + alphabet[alphabet.index(last) ^ 1]
+    return [
+        f"{token}=",
+        f"{token}==",
+        f"{encoded_header}=.{encoded_claims}.{encoded_signature}",
+        f"{encoded_header}.{encoded_claims}=.{encoded_signature}",
+        token.replace("-", "+").replace("_", "/"),
+        f"{encoded_header}.{encoded_claims}.{trailing_bits}",
+        f"{encoded_header}.{encoded_claims}.{encoded_signature[:10]}*{encoded_signature[10:]}",
+        f"{encoded_header}.{encoded_claims}.{encoded_signature[:10]}\n{encoded_signature[10:]}",
+    ]
+
+def test_rejects_non_canonical_spellings_of_a_valid_token(manager):
+    token = _token_with_urlsafe_chars(manager)
+    assert manager.decode(token) is not None
+    for variant in _respellings(token):
+        assert variant != token
+        # Same bytes to a lenient decoder, so only strictness keeps them out
+        assert _lenient_decode(variant) == _lenient_decode(token)
+        assert manager.decode(variant) is None, variant
+
+def test_python_jose_token_verifies_under_default_kid():
+    manager = KeyManager([HS256Key(DEFAULT_KID, "test-secret-key")], DEFAULT_KID)
+    assert manager.decode(JOSE_TOKEN) == {"sub": "legacy@example.com", "exp": 4102444800}
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import keys
+import main
+import revocation
+from auth import create_access_token, get_token_claims
+
+@pytest.fixture
+def client():
+    # No lifespan: the event bus stays unbound, so publish() is a no-op
+    return TestClient(main.app)
+
+def _bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+def _respellings(token):
+    encoded_header, encoded_claims, encoded_signature = token.split(".")
+    return [
+        f"{token}=",
+        f"{token}==",
+        f"{encoded_header}.{encoded_claims}=.{encoded_signature}",
+        token.replace("-", "+").replace("_", "/"),
+    ]
+
+def test_logged_out_token_stays_rejected_when_respelled(client):
+    token = create_access_token({"sub": "respelled@example.com"})
+    assert client.get("/verify-token", headers=_bearer(token)).status_code == 200
+    assert client.post("/logout", headers=_bearer(token)).status_code == 200
+
+    assert client.get("/verify-token", headers=_bearer(token)).status_code == 401
+    for variant in _respellings(token):
+        assert client.get("/verify-token", headers=_bearer(variant)).status_code == 401, variant
+        assert client.post("/create-session", headers=_bearer(variant)).status_code == 401, variant
+
+def test_logout_revokes_only_that_token(client):
+    # Same subject and same second: before jti these were the same string
+    first = create_access_token({"sub": "twice@example.com"})
+    second = create_access_token({"sub": "twice@example.com"})
+    assert first != second
+    client.post("/logout", headers=_bearer(first))
+    assert client.get("/verify-token", headers=_bearer(first)).status_code == 401
+    assert client.get("/verify-token", headers=_bearer(second)).status_code == 200
+
+def test_revocation_follows_jti_not_token_string():
+    claims = {"sub": "jti@example.com", "jti": "fixed-jti", "exp": int(time.time()) + 300}
+    token = keys.key_manager.encode(claims)
+    # Same claims serialized in another order: a different string for the same token
+    reordered = keys.key_manager.encode(dict(reversed(list(claims.items()))))
+    assert token != reordered
+    revocation.revoke_token(token, get_token_claims(token))
+    assert get_token_claims(token) is None
+    assert get_token_claims(reordered) is None
+
+def test_tokens_without_jti_are_revoked_by_string():
+    claims = {"sub": "legacy-logout@example.com", "exp": int(time.time()) + 300}
+    token = keys.key_manager.encode(claims)
+    revocation.revoke_token(token, claims)
+    assert get_token_claims(token) is None
+    assert get_token_claims(keys.key_manager.encode({**claims, "iat": 1})) is not None
+
+def test_session_with_revoked_token_is_rejected(client):
+    token = create_access_token({"sub": "session@example.com"})
+    session_id = client.post("/create-session", headers=_bearer(token)).json()["session_id"]
+    client.post("/logout", headers=_bearer(f"{token}="))
+    # A respelled token is not accepted by /logout either, so the session survives
+    assert client.get(f"/get-session/{session_id}").status_code == 200
+    client.post("/logout", headers=_bearer(token))
+    assert client.get(f"/get-session/{session_id}").status_code == 401
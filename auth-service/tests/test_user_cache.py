@@ -0,0 +1,80 @@
+import pytest
+
+import user_cache
+from database import User
+from user_cache import EmailFilter, UserCache
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(user_cache, "user_cache", UserCache(100))
+    monkeypatch.setattr(user_cache, "email_filter", EmailFilter(1000, 0.01))
+
+def _load(monkeypatch, emails, page_size=100):
+    pages = [[{"email": email} for email in emails[i:i + page_size]] for i in range(0, len(emails), page_size)]
+    monkeypatch.setattr(user_cache, "iter_user_pages", lambda size: iter(pages))
+    user_cache.load_email_filter()
+
+def test_unloaded_filter_means_might_exist():
+    email_filter = EmailFilter(1000, 0.01)
+    assert not email_filter.ready
+    assert email_filter.might_contain("anyone@example.com")
+
+def test_loaded_filter_rules_out_unknown_emails(monkeypatch):
+    _load(monkeypatch, ["a@example.com"])
+    assert user_cache.email_filter.ready
+    misses = sum(not user_cache.email_filter.might_contain(f"nobody{i}@example.com") for i in range(1000))
+    # 1% target error rate; allow plenty of slack but require the filter to be doing something
+    assert misses > 900
+
+def test_no_false_negatives_for_loaded_or_registered_emails(monkeypatch):
+    # Five times over capacity: the false-positive rate suffers, membership must not
+    loaded = [f"User{i}@Example.com" for i in range(5000)]
+    _load(monkeypatch, loaded)
+    registered = [f"new{i}@example.com" for i in range(100)]
+    for email in registered:
+        user_cache.user_registered(email)
+
+    email_filter = user_cache.email_filter
+    for email in loaded + registered:
+        assert email_filter.might_contain(email)
+        assert email_filter.might_contain(email.lower())
+        assert email_filter.might_contain(email.upper())
+
+def test_get_user_skips_database_for_filtered_emails(monkeypatch, session_factory):
+    _load(monkeypatch, [])
+    db = session_factory()
+    db.add(User(email="late@example.com", hashed_password="x"))
+    db.commit()
+    try:
+        # Not in the filter yet, so the row is not looked up
+        assert user_cache.get_user(db, "late@example.com") is None
+        user_cache.user_registered("late@example.com")
+        assert user_cache.get_user(db, "late@example.com").hashed_password == "x"
+    finally:
+        db.close()
+
+def test_user_registered_invalidates_cached_row(monkeypatch, session_factory):
+    _load(monkeypatch, ["a@example.com"])
+    db = session_factory()
+    db.add(User(email="a@example.com", hashed_password="old"))
+    db.commit()
+    try:
+        assert user_cache.get_user(db, "a@example.com").hashed_password == "old"
+        assert user_cache.get_user(db, "a@example.com").hashed_password == "old"
+        assert user_cache.user_cache.stats["hits"] == 1
+
+        db.query(User).filter(User.email == "a@example.com").update({User.hashed_password: "new"})
+        db.commit()
+        user_cache.user_registered("a@example.com")
+        assert user_cache.user_cache.stats["invalidations"] == 1
+        assert user_cache.get_user(db, "a@example.com").hashed_password == "new"
+    finally:
+        db.close()
+
+def test_lru_evicts_least_recently_used():
+    cache = UserCache(2)
+    for i in range(3):
+        cache.put(user_cache.CachedUser(i, f"u{i}@example.com", "x", True))
+    assert cache.get("u0@example.com") is None
+    assert cache.get("u2@example.com") is not None
+    assert cache.stats["evictions"] == 1
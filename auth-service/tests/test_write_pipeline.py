@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from database import OTPToken, User, WritePipeline
+from main import consume_otp
+
+def _add_user(email):
+    return lambda db: db.add(User(email=email, hashed_password="x"))
+
+def _emails(session_factory):
+    db = session_factory()
+    try:
+        return sorted(email for (email,) in db.query(User.email))
+    finally:
+        db.close()
+
+def test_duplicate_in_batch_fails_only_its_caller(session_factory):
+    pipeline = WritePipeline(session_factory)
+
+    async def run():
+        # Submitted before the writer task gets to run, so they form one batch
+        results = await asyncio.gather(
+            pipeline.submit(_add_user("a@example.com")),
+            pipeline.submit(_add_user("a@example.com")),
+            pipeline.submit(_add_user("b@example.com")),
+            return_exceptions=True,
+        )
+        await pipeline.stop()
+        return results
+
+    results = asyncio.run(run())
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], IntegrityError)
+    assert _emails(session_factory) == ["a@example.com", "b@example.com"]
+    stats = pipeline.get_stats()
+    assert stats["max_batch_seen"] == 3
+    assert stats["fallback_batches"] == 1
+
+def test_concurrent_otp_consume_succeeds_once(session_factory):
+    db = session_factory()
+    db.add(OTPToken(email="a@example.com", otp_code="123456"))
+    db.commit()
+    db.close()
+    pipeline = WritePipeline(session_factory)
+    created_after = datetime.utcnow() - timedelta(minutes=5)
+
+    def consume(db):
+        return consume_otp(db, "a@example.com", "123456", created_after)
+
+    async def run():
+        results = await asyncio.gather(pipeline.submit(consume), pipeline.submit(consume))
+        await pipeline.stop()
+        return results
+
+    assert asyncio.run(run()) == [1, 0]
+    assert pipeline.get_stats()["max_batch_seen"] == 2
+
+def test_otp_consume_rejects_wrong_or_expired_code(session_factory):
+    db = session_factory()
+    db.add(OTPToken(email="a@example.com", otp_code="123456", created_at=datetime.utcnow() - timedelta(minutes=10)))
+    db.commit()
+    try:
+        assert consume_otp(db, "a@example.com", "123456", datetime.utcnow() - timedelta(minutes=5)) == 0
+        assert consume_otp(db, "a@example.com", "654321", datetime.utcnow() - timedelta(minutes=15)) == 0
+    finally:
+        db.close()
+
+def test_stop_drains_queue(session_factory):
+    pipeline = WritePipeline(session_factory, max_batch=4)
+
+    async def run():
+        submissions = [asyncio.ensure_future(pipeline.submit(_add_user(f"u{i}@example.com"))) for i in range(10)]
+        # Let every submission reach the queue, then stop without awaiting them
+        await asyncio.sleep(0)
+        await pipeline.stop()
+        return submissions
+
+    submissions = asyncio.run(run())
+    assert all(submission.done() and submission.exception() is None for submission in submissions)
+    assert len(_emails(session_factory)) == 10
+    stats = pipeline.get_stats()
+    assert stats["operations"] == 10
+    assert stats["batches"] >= 3
+    assert stats["queue_depth"] == 0
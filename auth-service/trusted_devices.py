@@ -0,0 +1,40 @@
+import hashlib
+import os
+import secrets
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from sqlalchemy import func
+
+from database import TrustedDevice, write_pipeline
+
+load_dotenv()
+
+TRUSTED_DEVICE_DAYS = int(os.getenv("TRUSTED_DEVICE_DAYS", "30"))
+
+def _hash_token(device_token: str) -> str:
+    return hashlib.sha256(device_token.encode()).hexdigest()
+
+async def issue_device_token(email: str) -> str:
+    """Create a device token for email; only its SHA-256 is stored"""
+    device_token = secrets.token_urlsafe(32)
+    token_hash = _hash_token(device_token)
+    expires_at = datetime.utcnow() + timedelta(days=TRUSTED_DEVICE_DAYS)
+    await write_pipeline.submit(
+        lambda write_db: write_db.add(TrustedDevice(email=email, token_hash=token_hash, expires_at=expires_at))
+    )
+    return device_token
+
+async def forget_devices(email: str) -> int:
+    """Delete every trusted device of email, so its next login needs the OTP again"""
+    return await write_pipeline.submit(
+        lambda write_db: write_db.query(TrustedDevice).filter(
+            func.lower(TrustedDevice.email) == email.lower()
+        ).delete(synchronize_session=False)
+    )
+
+def is_trusted_device(db, email: str, device_token: str) -> bool:
+    """One indexed lookup by token hash; the token must belong to email and be unexpired"""
+    device = db.query(TrustedDevice).filter(
+        TrustedDevice.token_hash == _hash_token(device_token)
+    ).first()
+    return device is not None and device.email == email and device.expires_at > datetime.utcnow()
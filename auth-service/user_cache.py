@@ -0,0 +1,127 @@
+import hashlib
+import math
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from dotenv import load_dotenv
+
+from database import User
+from user_export import iter_user_pages
+
+load_dotenv()
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+EMAIL_FILTER_CAPACITY = int(os.getenv("EMAIL_FILTER_CAPACITY", "1000000"))
+EMAIL_FILTER_ERROR_RATE = float(os.getenv("EMAIL_FILTER_ERROR_RATE", "0.001"))
+
+# Immutable snapshot of the columns login needs, safe to share across sessions
+CachedUser = namedtuple("CachedUser", ["id", "email", "hashed_password", "is_active"])
+
+class EmailFilter:
+    """Bloom filter of registered emails; a miss means the email is definitely unknown"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+        # Until the filter is loaded from the database every email "might" exist
+        self.ready = False
+
+    def _positions(self, email: str):
+        digest = hashlib.blake2b(email.lower().encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, email: str):
+        for pos in self._positions(email):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def might_contain(self, email: str) -> bool:
+        if not self.ready:
+            return True
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(email))
+
+class UserCache:
+    """Bounded LRU of user rows by email, invalidated explicitly on every write"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "filter_skips": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, email: str):
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(email)
+            self.stats["hits"] += 1
+            return entry
+
+    def put(self, user: CachedUser):
+        with self._lock:
+            self._entries[user.email] = user
+            self._entries.move_to_end(user.email)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def invalidate(self, email: str):
+        with self._lock:
+            if self._entries.pop(email, None) is not None:
+                self.stats["invalidations"] += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+user_cache = UserCache(USER_CACHE_SIZE)
+email_filter = EmailFilter(EMAIL_FILTER_CAPACITY, EMAIL_FILTER_ERROR_RATE)
+
+def load_email_filter(page_size: int = 5000):
+    """Populate the email filter from the users table, paging on id"""
+    for users in iter_user_pages(page_size):
+        for user in users:
+            email_filter.add(user["email"])
+    email_filter.ready = True
+
+def get_user(db, email: str):
+    """Return a CachedUser for email, or None, querying the database only on a cache miss"""
+    if not email_filter.might_contain(email):
+        user_cache.stats["filter_skips"] += 1
+        return None
+
+    cached = user_cache.get(email)
+    if cached is not None:
+        return cached
+
+    db_user = db.query(User).filter(User.email == email).first()
+    if db_user is None:
+        return None
+    cached = CachedUser(db_user.id, db_user.email, db_user.hashed_password, db_user.is_active)
+    user_cache.put(cached)
+    return cached
+
+def user_registered(email: str):
+    """Call after a user row is inserted"""
+    email_filter.add(email)
+    user_cache.invalidate(email)
+
+def user_changed(email: str):
+    """Call after a user row is updated or deleted"""
+    user_cache.invalidate(email)
+
+def get_stats():
+    result = dict(user_cache.stats)
+    lookups = result["hits"] + result["misses"] + result["filter_skips"]
+    result["hit_rate"] = (result["hits"] + result["filter_skips"]) / lookups if lookups else 0.0
+    result["cached_users"] = len(user_cache)
+    result["filter_emails"] = email_filter.count
+    result["filter_bits"] = email_filter.num_bits
+    result["filter_hashes"] = email_filter.num_hashes
+    result["filter_ready"] = email_filter.ready
+    return result
@@ -0,0 +1,58 @@
+import csv
+import io
+import json
+
+from database import SessionLocal, User
+
+EXPORT_PAGE_SIZE = 1000
+EXPORT_FIELDS = ["id", "email", "is_active", "created_at"]
+
+def _to_dict(row):
+    return {
+        "id": row.id,
+        "email": row.email,
+        "is_active": row.is_active,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+    }
+
+def list_users(db, after_id: int = 0, limit: int = 100):
+    """One keyset page of users ordered by id; pass next_after_id back for the next page"""
+    rows = db.query(User.id, User.email, User.is_active, User.created_at).filter(
+        User.id > after_id
+    ).order_by(User.id).limit(limit).all()
+    return {
+        "users": [_to_dict(row) for row in rows],
+        "next_after_id": rows[-1].id if len(rows) == limit else None,
+    }
+
+def iter_user_pages(page_size: int = EXPORT_PAGE_SIZE, after_id: int = 0):
+    """Yield users a page (list of dicts) at a time, one short read transaction per page"""
+    while True:
+        db = SessionLocal()
+        try:
+            page = list_users(db, after_id, page_size)
+        finally:
+            db.close()
+        if page["users"]:
+            yield page["users"]
+        if page["next_after_id"] is None:
+            return
+        after_id = page["next_after_id"]
+
+# Both exports emit one chunk per page: the response iterates sync generators
+# through the threadpool, so per-row chunks would cost a thread hop per user.
+def export_ndjson():
+    for users in iter_user_pages():
+        yield "".join(json.dumps(user) + "\n" for user in users)
+
+def export_csv():
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for users in iter_user_pages():
+        writer.writerows(users)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()